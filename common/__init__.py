@@ -1,2 +1,2 @@
-from . import videoprocessing, ffmpeg, file_type
+from . import videoprocessing, ffmpeg, file_type, mpd, init_segment, jpeg_header, srs_index
 from .utils import run_subprocess, bit_round
@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import functools
 import json
+import os
 import pathlib
 import subprocess
 import logging
 from platform import system
 
-from . import exceptions, parser
+from . import exceptions, parser, pass_log
 from ..utils import InputSourceFacade
 
 if system() == "Windows":
@@ -73,6 +75,41 @@ def probe(source: bytearray | pathlib.Path | str):
     return result
 
 
+def keyframes(source: pathlib.Path | str, stream_index: int) -> tuple[float, ...]:
+    """
+    Returns sorted presentation times (in seconds) of the stream keyframes.
+
+    Only packet headers are read, frames are not decoded.
+    The index is cached while file size and modification time stay the same.
+    """
+    stat = os.stat(source)
+    return _keyframes(str(source), stream_index, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=64)
+def _keyframes(source: str, stream_index: int, mtime: int, size: int) -> tuple[float, ...]:
+    commandline = ["ffprobe"]
+    commandline += set_loglevel(logging.root.level)
+    commandline += [
+        "-select_streams",
+        str(stream_index),
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-print_format",
+        "json",
+        source,
+    ]
+    try:
+        data = json.loads(str(get_output(commandline), "utf-8"))
+    except UnicodeEncodeError:
+        raise exceptions.InvalidFilename(source)
+    times = []
+    for packet in data.get("packets", []):
+        if "K" in packet.get("flags", "") and packet.get("pts_time", "N/A") != "N/A":
+            times.append(float(packet["pts_time"]))
+    return tuple(sorted(times))
+
+
 def set_loglevel(loglevel):
     commandline = ["-loglevel"]
     match loglevel:
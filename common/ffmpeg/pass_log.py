@@ -0,0 +1,144 @@
+import contextlib
+import hashlib
+import logging
+import os
+import pathlib
+import time
+import uuid
+
+from ... import config
+
+logger = logging.getLogger(__name__)
+
+COMPLETE_MARKER_SUFFIX = ".done"
+TEMPORARY_PREFIX = ".tmp-"
+
+_source_digests: dict[tuple[str, int, int], str] = dict()
+
+
+def source_digest(source: pathlib.Path) -> str:
+    """
+    Returns the content hash of a source file.
+
+    The hash is memoized by (path, size, mtime), so every level
+    of a single encode hashes the source only once.
+    """
+    stat_result = source.stat()
+    key = (str(source.resolve()), stat_result.st_size, stat_result.st_mtime_ns)
+    if key not in _source_digests:
+        with source.open("rb") as f:
+            _source_digests[key] = hashlib.file_digest(f, "blake2b").hexdigest()
+    return _source_digests[key]
+
+
+class PassLogCache:
+    """
+    On-disk cache of ffmpeg first pass statistics.
+
+    Entries are keyed by the source content hash and everything that
+    affects the first pass (stream, filter chain, codec options),
+    so re-runs and levels with the same scaled size reuse
+    the same analysis instead of running pass 1 again.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path, lifetime: float | None = None):
+        self.cache_dir = cache_dir
+        self.lifetime = lifetime
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.prune()
+
+    def make_key(self, source: pathlib.Path, *parameters) -> str:
+        key_hash = hashlib.blake2b(digest_size=16)
+        key_hash.update(source_digest(source).encode())
+        for parameter in parameters:
+            key_hash.update(b"\x00")
+            key_hash.update(str(parameter).encode())
+        return key_hash.hexdigest()
+
+    def _marker(self, key: str) -> pathlib.Path:
+        return self.cache_dir.joinpath(key + COMPLETE_MARKER_SUFFIX)
+
+    def get_prefix(self, key: str) -> pathlib.Path:
+        return self.cache_dir.joinpath(key)
+
+    def lookup(self, key: str) -> pathlib.Path | None:
+        marker = self._marker(key)
+        if not marker.exists():
+            return None
+        # refresh entry lifetime
+        marker.touch()
+        logger.debug(f"first pass statistics cache hit: {key}")
+        return self.get_prefix(key)
+
+    @contextlib.contextmanager
+    def first_pass(self, key: str):
+        """
+        Yields a temporary pass log prefix for the first pass.
+
+        On success, the log files are moved to the entry prefix
+        and the entry is marked as complete. On failure,
+        every file written under the temporary prefix is removed.
+        """
+        temporary_prefix = self.cache_dir.joinpath(
+            f"{TEMPORARY_PREFIX}{key}-{uuid.uuid4().hex}"
+        )
+        try:
+            yield temporary_prefix
+        except BaseException:
+            self._remove_files(temporary_prefix.name)
+            raise
+        target_prefix = self.get_prefix(key)
+        for log_file in self.cache_dir.glob(temporary_prefix.name + "*"):
+            log_file.replace(self.cache_dir.joinpath(
+                target_prefix.name + log_file.name[len(temporary_prefix.name):]
+            ))
+        self._marker(key).touch()
+
+    def _remove_files(self, name_prefix: str):
+        for file in self.cache_dir.glob(name_prefix + "*"):
+            file.unlink(missing_ok=True)
+
+    def purge(self, key: str):
+        self._marker(key).unlink(missing_ok=True)
+        self._remove_files(key)
+
+    def prune(self):
+        """
+        Removes entries and leftovers of interrupted first passes
+        which are older than the cache lifetime.
+        """
+        if self.lifetime is None:
+            return
+        deadline = time.time() - self.lifetime
+        for file in self.cache_dir.iterdir():
+            try:
+                if file.stat().st_mtime >= deadline:
+                    continue
+            except FileNotFoundError:
+                continue
+            if file.name.endswith(COMPLETE_MARKER_SUFFIX):
+                self.purge(file.name[:-len(COMPLETE_MARKER_SUFFIX)])
+            elif file.name.startswith(TEMPORARY_PREFIX):
+                file.unlink(missing_ok=True)
+
+
+def default_cache_dir() -> pathlib.Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if cache_home:
+        return pathlib.Path(cache_home).joinpath("pyimglib", "pass-logs")
+    return pathlib.Path.home().joinpath(".cache", "pyimglib", "pass-logs")
+
+
+_cache: PassLogCache | None = None
+
+
+def get_cache() -> PassLogCache:
+    global _cache
+    if _cache is None:
+        cache_dir = config.first_pass_cache_dir
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        _cache = PassLogCache(
+            pathlib.Path(cache_dir), config.first_pass_cache_lifetime
+        )
+    return _cache
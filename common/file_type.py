@@ -1,16 +1,174 @@
+import enum
 import re
-from .utils import InputSourceFacade
+import zlib
+from typing import Callable
 
 svg_tag = re.compile(r'<svg[^>]*>')
 
+SNIFF_SIZE = 4096
+# SVG root element may follow a long prolog, doctype or comment
+SVG_SNIFF_SIZE = 64 * 1024
+
+GZIP_SIGNATURE = b"\x1f\x8b"
+UTF8_BOM = b"\xef\xbb\xbf"
+xml_comment = re.compile(rb"<!--.*?-->", re.DOTALL)
+xml_root_element = re.compile(rb"<(?![?!])([\w:.-]+)")
+
+
+class FileType(enum.Enum):
+    JPEG = enum.auto()
+    PNG = enum.auto()
+    GIF = enum.auto()
+    WEBP = enum.auto()
+    AVIF = enum.auto()
+    AVIF_SEQUENCE = enum.auto()
+    JPEG_XL = enum.auto()
+    Y4M = enum.auto()
+    MP4 = enum.auto()
+    MKV = enum.auto()
+    MPD = enum.auto()
+    SRS = enum.auto()
+    SVG = enum.auto()
+
+
+VIDEO_TYPES = frozenset({FileType.MP4, FileType.MKV, FileType.MPD})
+
+_sniffers: list[tuple[Callable[[bytes], bool], FileType]] = list()
+
+
+def sniffer(file_type: FileType):
+    """
+    Registers a check of the file prefix for the file type.
+    Checks are tried in registration order.
+    """
+    def register(check: Callable[[bytes], bool]):
+        _sniffers.append((check, file_type))
+        return check
+    return register
+
+
+@sniffer(FileType.JPEG)
+def _is_jpeg(prefix: bytes) -> bool:
+    return prefix[:2] == b'\xff\xd8'
+
+
+@sniffer(FileType.PNG)
+def _is_png(prefix: bytes) -> bool:
+    return prefix[:4] == b'\x89PNG'
+
+
+@sniffer(FileType.GIF)
+def _is_gif(prefix: bytes) -> bool:
+    return prefix[:6] in (b'GIF87a', b'GIF89a')
+
+
+@sniffer(FileType.WEBP)
+def _is_webp(prefix: bytes) -> bool:
+    return prefix[:4] == b'RIFF' and prefix[8:12] == b'WEBP'
+
+
+@sniffer(FileType.AVIF)
+def _is_avif(prefix: bytes) -> bool:
+    return prefix[4:12] == b'ftypavif'
+
+
+@sniffer(FileType.AVIF_SEQUENCE)
+def _is_avif_sequence(prefix: bytes) -> bool:
+    return prefix[4:12] == b'ftypavis'
+
+
+@sniffer(FileType.JPEG_XL)
+def _is_jpeg_xl(prefix: bytes) -> bool:
+    return prefix[:7] == b'\x00\x00\x00\x0cJXL' or prefix[:2] == b'\xff\x0a'
+
+
+@sniffer(FileType.Y4M)
+def _is_y4m(prefix: bytes) -> bool:
+    return prefix[:9] == b"YUV4MPEG2"
+
+
+@sniffer(FileType.MP4)
+def _is_mp4(prefix: bytes) -> bool:
+    return prefix[4:12] in (b"ftypisom", b"ftypmp42")
+
+
+@sniffer(FileType.MKV)
+def _is_mkv(prefix: bytes) -> bool:
+    return prefix[:4] == b"\x1a\x45\xdf\xa3"
+
+
+@sniffer(FileType.MPD)
+def _is_mpd(prefix: bytes) -> bool:
+    lines = prefix.split(b"\n", 2)
+    return b"<?xml" in lines[0] and b"<MPD" in b"\n".join(lines[:2])
+
+
+@sniffer(FileType.SRS)
+def _is_srs(prefix: bytes) -> bool:
+    return b"CLSRS" in prefix[:16]
+
+
+def read_prefix(source, size=SNIFF_SIZE) -> bytes:
+    """
+    Returns the first bytes of a file path, bytes-like object or binary stream.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(memoryview(source)[:size])
+    elif hasattr(source, "read") and hasattr(source, "seek"):
+        position = source.tell()
+        prefix = source.read(size)
+        source.seek(position)
+        return prefix
+    with open(source, "rb") as file:
+        return file.read(size)
+
+
+def sniff(source) -> FileType | None:
+    """
+    Detects file type by signature, reading the source prefix only once.
+    """
+    prefix = read_prefix(source)
+    for check, file_type in _sniffers:
+        if check(prefix):
+            return file_type
+    return None
+
+
+def read_svg_prefix(source, size=SVG_SNIFF_SIZE) -> bytes:
+    """
+    Returns up to size bytes of the SVG document text.
+    Compressed SVG (svgz) is decompressed up to the same bound.
+    """
+    prefix = read_prefix(source, size)
+    if prefix[:2] == GZIP_SIGNATURE:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            prefix = decompressor.decompress(prefix, size)
+        except zlib.error:
+            return b""
+    return prefix
+
+
+@sniffer(FileType.SVG)
+def is_svg_prefix(prefix: bytes) -> bool:
+    """
+    Checks that the root element of an XML document prefix is svg.
+    XML prolog, doctype, comments and processing instructions are skipped.
+    """
+    if prefix[:2] == GZIP_SIGNATURE:
+        prefix = read_svg_prefix(prefix)
+    if prefix.startswith(UTF8_BOM):
+        prefix = prefix[len(UTF8_BOM):]
+    prefix = prefix.lstrip()
+    if not prefix.startswith(b"<") or b"\x00" in prefix:
+        return False
+    prefix = xml_comment.sub(b"", prefix)
+    root_element = xml_root_element.search(prefix)
+    if root_element is None:
+        return False
+    name = root_element.group(1)
+    return name == b"svg" or name.endswith(b":svg")
+
 
 def is_svg(source):
-    data = None
-    with InputSourceFacade(source) as source_handler:
-        file_path = source_handler.get_file_path()
-        with open(file_path, 'r') as file:
-            try:
-                data = file.read()
-            except UnicodeDecodeError:
-                return False
-    return svg_tag.search(data) is not None
+    return is_svg_prefix(read_svg_prefix(source))
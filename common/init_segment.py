@@ -0,0 +1,197 @@
+import pathlib
+import struct
+
+MP4_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+VISUAL_SAMPLE_ENTRY_HEADER_SIZE = 78
+
+EBML_HEADER_ID = 0x1A45DFA3
+MATROSKA_SEGMENT_ID = 0x18538067
+MATROSKA_TRACKS_ID = 0x1654AE6B
+MATROSKA_TRACK_ENTRY_ID = 0xAE
+MATROSKA_TRACK_TYPE_ID = 0x83
+MATROSKA_CODEC_ID_ID = 0x86
+MATROSKA_CODEC_PRIVATE_ID = 0x63A2
+MATROSKA_VIDEO_TRACK = 1
+
+
+def iter_boxes(data: bytes, offset=0, end=None):
+    """
+    Yields (box type, payload offset, box end) of ISO-BMFF boxes
+    between offset and end.
+    """
+    if end is None:
+        end = len(data)
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset + header_size, min(offset + size, end)
+        offset += size
+
+
+def _find_sample_entry(data: bytes, offset=0, end=None):
+    for box_type, payload_offset, box_end in iter_boxes(data, offset, end):
+        if box_type in MP4_CONTAINER_BOXES:
+            sample_entry = _find_sample_entry(data, payload_offset, box_end)
+            if sample_entry is not None:
+                return sample_entry
+        elif box_type == b"stsd":
+            # full box header and entry count
+            for entry in iter_boxes(data, payload_offset + 8, box_end):
+                return entry
+    return None
+
+
+def av1_codec_string(av1c: bytes, sample_entry="av01") -> str | None:
+    if len(av1c) < 3 or av1c[0] & 0x7F != 1:
+        return None
+    profile = av1c[1] >> 5
+    level = av1c[1] & 0x1F
+    tier = "H" if av1c[2] & 0x80 else "M"
+    bit_depth = 8
+    if av1c[2] & 0x40:
+        bit_depth = 12 if av1c[2] & 0x20 else 10
+    return "{}.{}.{:02d}{}.{:02d}".format(sample_entry, profile, level, tier, bit_depth)
+
+
+def avc_codec_string(avcc: bytes, sample_entry="avc1") -> str | None:
+    if len(avcc) < 4:
+        return None
+    return "{}.{:02X}{:02X}{:02X}".format(sample_entry, avcc[1], avcc[2], avcc[3])
+
+
+def vp9_codec_string(vpcc: bytes, sample_entry="vp09") -> str | None:
+    # full box header precedes the configuration record
+    if len(vpcc) < 7:
+        return None
+    profile, level, bit_depth = vpcc[4], vpcc[5], vpcc[6] >> 4
+    return "{}.{:02d}.{:02d}.{:02d}".format(sample_entry, profile, level, bit_depth)
+
+
+def _mp4_codec_string(data: bytes) -> str | None:
+    sample_entry = _find_sample_entry(data)
+    if sample_entry is None:
+        return None
+    sample_entry_type, payload_offset, box_end = sample_entry
+    sample_entry_name = sample_entry_type.decode("ascii", errors="replace")
+    for box_type, config_offset, config_end in iter_boxes(
+        data, payload_offset + VISUAL_SAMPLE_ENTRY_HEADER_SIZE, box_end
+    ):
+        config_record = data[config_offset:config_end]
+        if box_type == b"av1C":
+            return av1_codec_string(config_record, sample_entry_name)
+        elif box_type == b"avcC":
+            return avc_codec_string(config_record, sample_entry_name)
+        elif box_type == b"vpcC":
+            return vp9_codec_string(config_record, sample_entry_name)
+    return None
+
+
+def _read_ebml_id(data: bytes, offset: int) -> tuple[int, int]:
+    first = data[offset]
+    length = 1
+    while length <= 4 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 4:
+        raise ValueError("invalid EBML element ID")
+    return int.from_bytes(data[offset:offset + length], "big"), offset + length
+
+
+def _read_ebml_size(data: bytes, offset: int) -> tuple[int | None, int]:
+    first = data[offset]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise ValueError("invalid EBML element size")
+    value = first & (0xFF >> length)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    if value == (1 << (7 * length)) - 1:
+        # unknown size
+        return None, offset + length
+    return value, offset + length
+
+
+def iter_ebml_elements(data: bytes, offset=0, end=None):
+    """
+    Yields (element ID, payload offset, element end) of EBML elements
+    between offset and end.
+    """
+    if end is None:
+        end = len(data)
+    while offset < end:
+        try:
+            element_id, offset = _read_ebml_id(data, offset)
+            size, offset = _read_ebml_size(data, offset)
+        except (ValueError, IndexError):
+            return
+        element_end = end if size is None else min(offset + size, end)
+        yield element_id, offset, element_end
+        offset = element_end
+
+
+def _vp9_codec_private_string(codec_private: bytes) -> str | None:
+    features = dict()
+    offset = 0
+    while offset + 2 <= len(codec_private):
+        feature_id, length = codec_private[offset], codec_private[offset + 1]
+        features[feature_id] = codec_private[offset + 2:offset + 2 + length]
+        offset += 2 + length
+    if 1 not in features or 2 not in features:
+        return None
+    bit_depth = features[3][0] if 3 in features else 8
+    return "vp09.{:02d}.{:02d}.{:02d}".format(
+        features[1][0], features[2][0], bit_depth
+    )
+
+
+def _matroska_codec_string(data: bytes) -> str | None:
+    for element_id, offset, end in iter_ebml_elements(data):
+        if element_id != MATROSKA_SEGMENT_ID:
+            continue
+        for tracks_id, tracks_offset, tracks_end in iter_ebml_elements(data, offset, end):
+            if tracks_id != MATROSKA_TRACKS_ID:
+                continue
+            for entry_id, entry_offset, entry_end in iter_ebml_elements(
+                data, tracks_offset, tracks_end
+            ):
+                if entry_id != MATROSKA_TRACK_ENTRY_ID:
+                    continue
+                track = dict()
+                for child_id, child_offset, child_end in iter_ebml_elements(
+                    data, entry_offset, entry_end
+                ):
+                    track[child_id] = data[child_offset:child_end]
+                track_type = int.from_bytes(track.get(MATROSKA_TRACK_TYPE_ID, b""), "big")
+                if track_type != MATROSKA_VIDEO_TRACK:
+                    continue
+                codec_id = track.get(MATROSKA_CODEC_ID_ID, b"").rstrip(b"\x00")
+                codec_private = track.get(MATROSKA_CODEC_PRIVATE_ID, b"")
+                if codec_id == b"V_AV1":
+                    return av1_codec_string(codec_private)
+                elif codec_id == b"V_VP9":
+                    return _vp9_codec_private_string(codec_private)
+                elif codec_id == b"V_MPEG4/ISO/AVC":
+                    return avc_codec_string(codec_private)
+                return None
+    return None
+
+
+def codec_string(init_segment: pathlib.Path) -> str | None:
+    """
+    Returns the RFC 6381 codec string of the first video track
+    of an MP4 or WebM initialization segment.
+    """
+    data = init_segment.read_bytes()
+    if len(data) >= 4 and int.from_bytes(data[:4], "big") == EBML_HEADER_ID:
+        return _matroska_codec_string(data)
+    return _mp4_codec_string(data)
@@ -0,0 +1,131 @@
+import dataclasses
+import functools
+import mmap
+import os
+import pathlib
+import struct
+
+SOI = b"\xff\xd8"
+
+SOS = 0xda
+EOI = 0xd9
+APP1 = 0xe1
+APP2 = 0xe2
+APP13 = 0xed
+# markers without payload: TEM, RST0-RST7, SOI, EOI
+STANDALONE_MARKERS = {0x01, *range(0xd0, 0xda)}
+# SOF markers, except DHT (c4), JPG (c8) and DAC (cc)
+START_OF_FRAME_MARKERS = {
+    0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7,
+    0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf
+}
+PROGRESSIVE_SOF_MARKERS = {0xc2, 0xc6, 0xca, 0xce}
+ARITHMETIC_SOF_MARKERS = {0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf}
+
+EXIF_SIGNATURE = b"Exif\x00\x00"
+ICC_SIGNATURE = b"ICC_PROFILE\x00"
+PHOTOSHOP_SIGNATURE = b"Photoshop 3.0\x00"
+
+
+@dataclasses.dataclass(frozen=True)
+class JPEGHeader:
+    width: int
+    height: int
+    # (horizontal, vertical) sampling factors of each component
+    sampling_factors: tuple[tuple[int, int], ...]
+    arithmetic_coding: bool
+    progressive: bool
+    # (offset, length) of TIFF data in APP1 Exif segment
+    exif: tuple[int, int] | None
+    # (offset, length) of the first APP13 Photoshop segment payload (IPTC)
+    app13: tuple[int, int] | None
+    icc_profile: bool
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+
+def scan_header(data) -> JPEGHeader:
+    """
+    Walks JPEG markers once, up to the start of scan,
+    and collects frame parameters and metadata segments positions.
+    data may be bytes or mmap.
+    """
+    if data[:2] != SOI:
+        raise ValueError("not a JPEG file")
+    data_size = len(data)
+    position = 2
+    frame = None
+    exif = None
+    app13 = None
+    icc_profile = False
+    while position < data_size:
+        if data[position] != 0xff:
+            # garbage between segments
+            position += 1
+            continue
+        # fill bytes
+        while position < data_size and data[position] == 0xff:
+            position += 1
+        if position >= data_size:
+            break
+        marker = data[position]
+        position += 1
+        if marker == 0 or marker in STANDALONE_MARKERS:
+            if marker == EOI:
+                break
+            continue
+        if position + 2 > data_size:
+            break
+        segment_length = struct.unpack_from(">H", data, position)[0]
+        payload = position + 2
+        payload_end = position + segment_length
+        if marker in START_OF_FRAME_MARKERS:
+            height, width, components = struct.unpack_from(">HHB", data, payload + 1)
+            sampling_factors = []
+            for component in range(components):
+                factors = data[payload + 6 + component * 3 + 1]
+                sampling_factors.append((factors >> 4, factors & 0x0f))
+            frame = (
+                width,
+                height,
+                tuple(sampling_factors),
+                marker in ARITHMETIC_SOF_MARKERS,
+                marker in PROGRESSIVE_SOF_MARKERS
+            )
+        elif marker == APP1 and exif is None and \
+                data[payload:payload + len(EXIF_SIGNATURE)] == EXIF_SIGNATURE:
+            exif = (
+                payload + len(EXIF_SIGNATURE),
+                payload_end - payload - len(EXIF_SIGNATURE)
+            )
+        elif marker == APP2 and data[payload:payload + len(ICC_SIGNATURE)] == ICC_SIGNATURE:
+            icc_profile = True
+        elif marker == APP13 and app13 is None and \
+                data[payload:payload + len(PHOTOSHOP_SIGNATURE)] == PHOTOSHOP_SIGNATURE:
+            app13 = (payload, payload_end - payload)
+        elif marker == SOS:
+            break
+        position = payload_end
+    if frame is None:
+        raise ValueError("start of frame marker not found")
+    return JPEGHeader(*frame, exif, app13, icc_profile)
+
+
+@functools.lru_cache(maxsize=256)
+def _read_header(file_path: str, mtime: int, size: int) -> JPEGHeader:
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scan_header(data)
+
+
+def read_header(source) -> JPEGHeader:
+    """
+    Returns JPEG header of a file path or bytes-like object.
+    File results are cached while file size and modification time stay the same.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return scan_header(source)
+    stat = os.stat(source)
+    return _read_header(str(pathlib.Path(source).resolve()), stat.st_mtime_ns, stat.st_size)
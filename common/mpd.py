@@ -0,0 +1,225 @@
+import math
+import pathlib
+import re
+import xml.etree.ElementTree
+
+MPD_NAMESPACE = "urn:mpeg:dash:schema:mpd:2011"
+
+ParseError = xml.etree.ElementTree.ParseError
+
+iso8601_duration_regex = re.compile(
+    r"P(?:(?P<days>[\d.]+)D)?"
+    r"(?:T(?:(?P<hours>[\d.]+)H)?(?:(?P<minutes>[\d.]+)M)?(?:(?P<seconds>[\d.]+)S)?)?"
+)
+representation_tag_regex = re.compile(r"<Representation[\s>]")
+template_identifier_regex = re.compile(
+    r"\$(?:(?P<identifier>RepresentationID|Number|Time|Bandwidth)(?P<format>%0\d+d)?)?\$"
+)
+
+
+def _tag(name: str) -> str:
+    return "{{{}}}{}".format(MPD_NAMESPACE, name)
+
+
+def parse_duration(value: str | None) -> float | None:
+    if value is None:
+        return None
+    match = iso8601_duration_regex.fullmatch(value)
+    if match is None:
+        return None
+    return (
+        float(match.group("days") or 0) * 86400 +
+        float(match.group("hours") or 0) * 3600 +
+        float(match.group("minutes") or 0) * 60 +
+        float(match.group("seconds") or 0)
+    )
+
+
+def expand_template(template: str, representation, number=None, time=None) -> str:
+    def replace(match: re.Match) -> str:
+        identifier = match.group("identifier")
+        if identifier is None:
+            return "$"
+        if identifier == "RepresentationID":
+            return representation.get("id")
+        if identifier == "Bandwidth":
+            value = int(representation.get("bandwidth"))
+        elif identifier == "Number":
+            value = number
+        else:
+            value = time
+        value_format = match.group("format") or "%d"
+        return value_format % value
+
+    return template_identifier_regex.sub(replace, template)
+
+
+def _segment_template(*elements):
+    """
+    Merges SegmentTemplate attributes inherited
+    from period, adaptation set and representation levels.
+    """
+    attributes = dict()
+    timeline = None
+    for element in elements:
+        template = element.find(_tag("SegmentTemplate"))
+        if template is None:
+            continue
+        attributes.update(template.attrib)
+        template_timeline = template.find(_tag("SegmentTimeline"))
+        if template_timeline is not None:
+            timeline = template_timeline
+    if not attributes:
+        return None, None
+    return attributes, timeline
+
+
+def _timeline_segments(timeline, timescale: int, period_duration: float | None):
+    time = 0
+    for s_element in timeline.findall(_tag("S")):
+        time = int(s_element.get("t", time))
+        duration = int(s_element.get("d"))
+        repeat = int(s_element.get("r", 0))
+        if repeat < 0:
+            # repeat until the end of the period
+            if period_duration is None:
+                repeat = 0
+            else:
+                repeat = max(
+                    math.ceil((period_duration * timescale - time) / duration) - 1, 0
+                )
+        for i in range(repeat + 1):
+            yield time
+            time += duration
+
+
+def _iter_representations(root):
+    presentation_duration = parse_duration(root.get("mediaPresentationDuration"))
+    for period in root.iter(_tag("Period")):
+        period_duration = parse_duration(period.get("duration"))
+        if period_duration is None:
+            period_duration = presentation_duration
+        for adaptation_set in period.iter(_tag("AdaptationSet")):
+            for representation in adaptation_set.iter(_tag("Representation")):
+                attributes, timeline = _segment_template(
+                    period, adaptation_set, representation
+                )
+                yield representation, attributes, timeline, period_duration
+
+
+def init_segments(mpd_file: pathlib.Path) -> dict[str, pathlib.Path]:
+    """
+    Returns initialization segment files by representation ID.
+    """
+    parent_dir = mpd_file.parent
+    root = xml.etree.ElementTree.parse(mpd_file).getroot()
+    files = dict()
+    for representation, attributes, timeline, period_duration in _iter_representations(root):
+        if attributes is not None and "initialization" in attributes:
+            files[representation.get("id")] = parent_dir.joinpath(
+                expand_template(attributes["initialization"], representation)
+            )
+    return files
+
+
+def segment_files(mpd_file: pathlib.Path) -> list[pathlib.Path]:
+    """
+    Returns the init and media segment files referenced by the manifest.
+
+    Segment lists are computed from SegmentTimeline
+    or from segment duration and presentation duration,
+    so the output directory is never listed.
+    Only the tail of duration based lists is checked to exist.
+    """
+    parent_dir = mpd_file.parent
+    root = xml.etree.ElementTree.parse(mpd_file).getroot()
+    files = []
+    for representation, attributes, timeline, period_duration in _iter_representations(root):
+        if attributes is None:
+            base_url = representation.find(_tag("BaseURL"))
+            if base_url is not None and base_url.text:
+                files.append(parent_dir.joinpath(base_url.text.strip()))
+            continue
+        if "initialization" in attributes:
+            files.append(parent_dir.joinpath(
+                expand_template(attributes["initialization"], representation)
+            ))
+        if "media" not in attributes:
+            continue
+        timescale = int(attributes.get("timescale", 1))
+        start_number = int(attributes.get("startNumber", 1))
+        if timeline is not None:
+            times = _timeline_segments(timeline, timescale, period_duration)
+            for i, time in enumerate(times):
+                files.append(parent_dir.joinpath(expand_template(
+                    attributes["media"], representation, start_number + i, time
+                )))
+        elif "duration" in attributes and period_duration is not None:
+            segment_duration = int(attributes["duration"])
+            segments_count = math.ceil(
+                period_duration * timescale / segment_duration
+            )
+            # presentation duration is rounded, so the count may be off by one:
+            # the segments from the last estimated one are checked to exist
+            i = 0
+            while True:
+                file = parent_dir.joinpath(expand_template(
+                    attributes["media"], representation,
+                    start_number + i, i * segment_duration
+                ))
+                if i >= segments_count - 1 and not file.exists():
+                    break
+                files.append(file)
+                i += 1
+    return files
+
+
+def _attribute_regex(name: str) -> re.Pattern:
+    return re.compile(r'\s{}=(?P<quote>["\'])(?P<value>.*?)(?P=quote)'.format(name))
+
+
+def _patch_representation_tag(tag: str, codecs: dict[str, str]) -> str:
+    id_match = _attribute_regex("id").search(tag)
+    if id_match is None or id_match.group("value") not in codecs:
+        return tag
+    codec_string = codecs[id_match.group("value")]
+    codecs_attribute_regex = _attribute_regex("codecs")
+    if codecs_attribute_regex.search(tag) is not None:
+        return codecs_attribute_regex.sub(
+            lambda match: ' codecs="{}"'.format(codec_string), tag, count=1
+        )
+    return tag.replace("<Representation", '<Representation codecs="{}"'.format(codec_string), 1)
+
+
+def set_representation_codecs(mpd_file: pathlib.Path, codecs: dict[str, str]):
+    """
+    Sets codecs attributes of Representation elements by their IDs.
+
+    The manifest is streamed line by line and only Representation
+    start tags are rewritten, the rest of the document stays as is.
+    """
+    tmp_file = mpd_file.with_name(mpd_file.name + ".tmp")
+    with mpd_file.open("r", encoding="utf-8") as source, \
+            tmp_file.open("w", encoding="utf-8") as destination:
+        tag_buffer = None
+        for line in source:
+            if tag_buffer is not None:
+                tag_buffer += line
+                if ">" not in line:
+                    continue
+                line, tag_buffer = tag_buffer, None
+            match = representation_tag_regex.search(line)
+            while match is not None:
+                start = match.start()
+                end = line.find(">", start)
+                if end < 0:
+                    tag_buffer = line
+                    break
+                tag = _patch_representation_tag(line[start:end + 1], codecs)
+                line = line[:start] + tag + line[end + 1:]
+                match = representation_tag_regex.search(line, start + len(tag))
+            if tag_buffer is None:
+                destination.write(line)
+        if tag_buffer is not None:
+            destination.write(tag_buffer)
+    tmp_file.replace(mpd_file)
@@ -0,0 +1,254 @@
+import contextlib
+import logging
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+JOB_DIR_PREFIX = "job-"
+RESERVATION_SUFFIX = ".reservation"
+LOCK_FILE_NAME = ".lock"
+# seconds between quota checks while waiting for jobs of other processes
+POLL_INTERVAL = 1
+
+
+class ScratchJob:
+    """
+    Per-job scratch directory. Every file of the job is placed here
+    and removed together with the directory.
+    """
+
+    def __init__(self, job_dir: pathlib.Path):
+        self.job_dir = job_dir
+
+    def file(self, suffix="") -> pathlib.Path:
+        return self.job_dir.joinpath(uuid.uuid4().hex + suffix)
+
+    def usage(self) -> int:
+        return directory_usage(self.job_dir)
+
+
+class ScratchSpace:
+    """
+    Allocates job directories for encoder intermediates under one root.
+
+    Every job reserves an estimated amount of bytes on admission.
+    Reservations are kept as files next to job directories
+    and counted under a file lock, so the quota is shared
+    by all processes using the same root. Without file locking
+    (neither fcntl nor msvcrt is available), only the jobs
+    of this process are coordinated.
+    If the quota is exhausted, the job waits until other jobs
+    release their reservations. A job which exceeds the quota on its own
+    is admitted only when nothing else is reserved.
+    """
+
+    def __init__(self, root: pathlib.Path, quota: int | None = None):
+        self.root = root
+        self.quota = quota
+        self._condition = threading.Condition()
+        self._thread_lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock_file = self.root.joinpath(LOCK_FILE_NAME)
+        self._remove_stale_jobs()
+
+    def _remove_stale_jobs(self):
+        """
+        Removes job directories and reservations left by crashed processes.
+        """
+        with self._locked():
+            for job_path in self.root.glob(JOB_DIR_PREFIX + "*"):
+                pid = _job_pid(job_path.name)
+                if pid is None or pid == os.getpid() or _is_process_alive(pid):
+                    continue
+                logger.info("remove stale scratch job {}".format(job_path))
+                if job_path.is_dir():
+                    shutil.rmtree(job_path, ignore_errors=True)
+                else:
+                    job_path.unlink(missing_ok=True)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._thread_lock, self._lock_file.open("a+") as lock:
+            _lock_file(lock)
+            try:
+                yield
+            finally:
+                _unlock_file(lock)
+
+    def _read_reservations(self) -> int:
+        """
+        Sums reservations of running jobs. The lock must be held.
+        """
+        reserved = 0
+        for reservation_file in self.root.glob(JOB_DIR_PREFIX + "*" + RESERVATION_SUFFIX):
+            pid = _job_pid(reservation_file.name)
+            if pid is not None and pid != os.getpid() and not _is_process_alive(pid):
+                reservation_file.unlink(missing_ok=True)
+                continue
+            try:
+                reserved += int(reservation_file.read_text())
+            except (FileNotFoundError, ValueError):
+                pass
+        return reserved
+
+    def _admit(self, reserve: int) -> pathlib.Path:
+        while True:
+            with self._locked():
+                reserved = self._read_reservations()
+                if self.quota is None or reserved == 0 or reserved + reserve <= self.quota:
+                    job_dir = pathlib.Path(tempfile.mkdtemp(
+                        prefix="{}{}-".format(JOB_DIR_PREFIX, os.getpid()), dir=self.root
+                    ))
+                    _reservation_file(job_dir).write_text(str(reserve))
+                    return job_dir
+            logger.debug("scratch quota exhausted, waiting")
+            # jobs of this process wake up waiters at once,
+            # releases by other processes are noticed by polling
+            with self._condition:
+                self._condition.wait(POLL_INTERVAL)
+
+    def _release(self, job_dir: pathlib.Path):
+        with self._locked():
+            _reservation_file(job_dir).unlink(missing_ok=True)
+        with self._condition:
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def job(self, reserve: int = 0):
+        """
+        Yields a ScratchJob. Its directory is removed on exit,
+        whether the job succeeded or not.
+        """
+        job_dir = self._admit(reserve)
+        try:
+            yield ScratchJob(job_dir)
+        finally:
+            logger.debug("scratch job {} used {} bytes of {} reserved".format(
+                job_dir.name, directory_usage(job_dir), reserve
+            ))
+            shutil.rmtree(job_dir, ignore_errors=True)
+            self._release(job_dir)
+
+    def reserved(self) -> int:
+        with self._locked():
+            return self._read_reservations()
+
+    def usage(self) -> int:
+        return directory_usage(self.root)
+
+
+def _job_pid(name: str) -> int | None:
+    try:
+        return int(name[len(JOB_DIR_PREFIX):].split("-")[0])
+    except ValueError:
+        return None
+
+
+def _lock_file(lock):
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        # the first byte is locked, LK_LOCK gives up after 10 attempts
+        lock.seek(0)
+        while True:
+            try:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass
+
+
+def _unlock_file(lock):
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        lock.seek(0)
+        msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _is_process_alive(pid: int) -> bool:
+    if sys.platform == "win32":
+        return _is_windows_process_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _is_windows_process_alive(pid: int) -> bool:
+    # os.kill terminates processes on Windows, so the process is queried instead
+    import ctypes
+    from ctypes import wintypes
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    STILL_ACTIVE = 259
+    ERROR_INVALID_PARAMETER = 87
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # no such process, any other error (access denied) means it exists
+        return ctypes.get_last_error() != ERROR_INVALID_PARAMETER
+    try:
+        exit_code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _reservation_file(job_dir: pathlib.Path) -> pathlib.Path:
+    return job_dir.with_name(job_dir.name + RESERVATION_SUFFIX)
+
+
+def directory_usage(directory: pathlib.Path) -> int:
+    usage = 0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                usage += os.stat(os.path.join(dirpath, filename)).st_size
+            except FileNotFoundError:
+                pass
+    return usage
+
+
+_scratch_space: ScratchSpace | None = None
+_scratch_space_lock = threading.Lock()
+
+
+def get_scratch_space() -> ScratchSpace:
+    global _scratch_space
+    with _scratch_space_lock:
+        if _scratch_space is None:
+            root = config.scratch_dir
+            if root is None:
+                root = pathlib.Path(tempfile.gettempdir()).joinpath("pyimglib-scratch")
+            _scratch_space = ScratchSpace(pathlib.Path(root), config.scratch_quota)
+    return _scratch_space
+
+
+def job(reserve: int = 0):
+    return get_scratch_space().job(reserve)
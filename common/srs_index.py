@@ -0,0 +1,259 @@
+import io
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = ".srs-index.sqlite"
+MANIFEST_SUFFIX = ".srs"
+# seconds to wait for a lock held by another process
+BUSY_TIMEOUT = 10
+
+MEDIA_TYPE_CODE_TO_STREAM_TYPE_KEY = {
+    0: ("image",),
+    1: ("audio",),
+    2: ("video", "audio"),
+    3: ("video",),
+}
+
+
+def manifest_files(srs_data: dict) -> list[str]:
+    """
+    Returns names of all files referenced by the manifest.
+    """
+    files = []
+    for image_key in ("poster-image", "cover-image"):
+        if image_key in srs_data["content"]:
+            levels = srs_data["content"][image_key]["levels"]
+            for level in levels:
+                files.append(levels[level])
+    attachment = srs_data["content"].get("attachment", dict())
+    if "storyboard" in attachment:
+        files.append(attachment["storyboard"]["file"])
+    stream_type_keys = MEDIA_TYPE_CODE_TO_STREAM_TYPE_KEY[
+        srs_data["content"]["media-type"]
+    ]
+    for stream_type_key in stream_type_keys:
+        if stream_type_key == "audio":
+            for stream in srs_data["streams"]["audio"]:
+                for channel in stream["channels"]:
+                    for level in stream["channels"][channel]:
+                        files.append(stream["channels"][channel][level])
+        else:
+            levels = srs_data["streams"][stream_type_key]["levels"]
+            for level in levels:
+                files.append(levels[level])
+    return files
+
+
+class SrsIndex:
+    """
+    SQLite index of SRS manifests in a directory.
+
+    Every entry keeps the manifest text, media type and file list,
+    and is valid while the manifest size and modification time are the same.
+    Missing or stale entries are refreshed from the manifest on access.
+    Database errors are logged and the manifest file is read instead,
+    the index is only a cache of it.
+    Parsed manifests are kept in memory, so they are parsed once per process.
+    """
+
+    def __init__(self, directory: pathlib.Path):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._parsed: dict[str, tuple[tuple[int, int], object]] = dict()
+        self._connection = sqlite3.connect(
+            directory.joinpath(INDEX_FILE_NAME),
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False
+        )
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS manifests ("
+                "name TEXT PRIMARY KEY, "
+                "mtime INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "media_type INTEGER NOT NULL, "
+                "files TEXT NOT NULL, "
+                "data TEXT NOT NULL)"
+            )
+
+    def update(
+        self,
+        manifest_file: pathlib.Path,
+        srs_data: dict,
+        stat: os.stat_result | None = None,
+        text: str | None = None
+    ):
+        """
+        text is the manifest file content, srs_data serialized by default.
+        """
+        if stat is None:
+            stat = manifest_file.stat()
+        if text is None:
+            text = json.dumps(srs_data)
+        try:
+            with self._lock, self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO manifests VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        manifest_file.name,
+                        stat.st_mtime_ns,
+                        stat.st_size,
+                        srs_data["content"]["media-type"],
+                        json.dumps(manifest_files(srs_data)),
+                        text,
+                    )
+                )
+        except sqlite3.Error as e:
+            logger.warning("SRS index of {} is not updated: {}".format(self.directory, e))
+
+    def _get_row(self, manifest_file: pathlib.Path, stat: os.stat_result) -> tuple:
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT media_type, files, data FROM manifests "
+                    "WHERE name = ? AND mtime = ? AND size = ?",
+                    (manifest_file.name, stat.st_mtime_ns, stat.st_size)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("SRS index of {} is not readable: {}".format(self.directory, e))
+            row = None
+        if row is None:
+            text = manifest_file.read_text()
+            srs_data = json.loads(text)
+            self.update(manifest_file, srs_data, stat, text)
+            row = (
+                srs_data["content"]["media-type"],
+                json.dumps(manifest_files(srs_data)),
+                text
+            )
+        return row
+
+    def media_type(self, manifest_file: pathlib.Path) -> int:
+        return self._get_row(manifest_file, manifest_file.stat())[0]
+
+    def files(self, manifest_file: pathlib.Path) -> list[str]:
+        return json.loads(self._get_row(manifest_file, manifest_file.stat())[1])
+
+    def manifest_text(self, manifest_file: pathlib.Path) -> str:
+        return self._get_row(manifest_file, manifest_file.stat())[2]
+
+    def parse(self, manifest_file: pathlib.Path, parser):
+        """
+        Returns parser result for the manifest text.
+        The result is shared by callers until the manifest is changed.
+        """
+        stat = manifest_file.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            parsed = self._parsed.get(manifest_file.name)
+        if parsed is not None and parsed[0] == key:
+            return parsed[1]
+        result = parser(io.StringIO(self._get_row(manifest_file, stat)[2]))
+        with self._lock:
+            self._parsed[manifest_file.name] = (key, result)
+        return result
+
+    def scan(self) -> dict[str, int]:
+        """
+        Returns media types of all manifests in the directory.
+        Only stale manifests are read, deleted ones are removed from the index.
+        """
+        try:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT name, mtime, size, media_type FROM manifests"
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("SRS index of {} is not readable: {}".format(self.directory, e))
+            rows = []
+        entries = {row[0]: row[1:] for row in rows}
+        media_types = dict()
+        with os.scandir(self.directory) as directory_entries:
+            for entry in directory_entries:
+                if not entry.name.endswith(MANIFEST_SUFFIX) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                indexed = entries.pop(entry.name, None)
+                if indexed is not None and indexed[:2] == (stat.st_mtime_ns, stat.st_size):
+                    media_types[entry.name] = indexed[2]
+                else:
+                    media_types[entry.name] = self._get_row(pathlib.Path(entry.path), stat)[0]
+        if entries:
+            try:
+                with self._lock, self._connection:
+                    self._connection.executemany(
+                        "DELETE FROM manifests WHERE name = ?",
+                        [(name,) for name in entries]
+                    )
+            except sqlite3.Error as e:
+                logger.warning("SRS index of {} is not updated: {}".format(self.directory, e))
+        return media_types
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_indexes: dict[pathlib.Path, SrsIndex | None] = dict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(directory: pathlib.Path) -> SrsIndex | None:
+    """
+    Returns the index of the directory,
+    or None if indexing is disabled or the index can't be opened.
+    """
+    if not config.srs_index:
+        return None
+    directory = directory.resolve()
+    with _indexes_lock:
+        if directory not in _indexes:
+            try:
+                _indexes[directory] = SrsIndex(directory)
+            except sqlite3.Error as e:
+                logger.warning("SRS index of {} is not available: {}".format(directory, e))
+                _indexes[directory] = None
+        return _indexes[directory]
+
+
+def write_manifest(manifest_file: pathlib.Path, srs_data: dict):
+    text = json.dumps(srs_data)
+    manifest_file.write_text(text)
+    index = get_index(manifest_file.parent)
+    if index is not None:
+        index.update(manifest_file, srs_data, text=text)
+
+
+def parse_manifest(manifest_file: pathlib.Path, parser):
+    """
+    Returns parser result for the manifest file object.
+    With the index, the manifest is parsed once per process
+    and the result is shared until the manifest is changed.
+    """
+    index = get_index(manifest_file.parent)
+    if index is not None:
+        return index.parse(manifest_file, parser)
+    with manifest_file.open("r") as f:
+        return parser(f)
+
+
+def media_type(manifest_file: pathlib.Path) -> int:
+    index = get_index(manifest_file.parent)
+    if index is not None:
+        return index.media_type(manifest_file)
+    return json.loads(manifest_file.read_text())["content"]["media-type"]
+
+
+def files(manifest_file: pathlib.Path) -> list[str]:
+    index = get_index(manifest_file.parent)
+    if index is not None:
+        return index.files(manifest_file)
+    return manifest_files(json.loads(manifest_file.read_text()))
@@ -97,7 +97,7 @@ class InputSourceFacade:
             return self._source
         else:
             if type(self._source) is str:
-                file_path = pathlib.Path(str)
+                file_path = pathlib.Path(self._source)
             elif isinstance(self._source, pathlib.Path):
                 file_path = self._source
             else:
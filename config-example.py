@@ -70,10 +70,39 @@ SRS_QSCALE = 1.25
 
 dash_low_tier_crf_gap = 4
 
+# First pass statistics of two-pass video encodings are cached
+# and reused across re-runs and levels with the same scaled size.
+# If None, $XDG_CACHE_HOME/pyimglib/pass-logs is used.
+first_pass_cache_dir = None
+# Cache entries lifetime in seconds. If None, entries are never removed.
+first_pass_cache_lifetime = 7 * 24 * 60 * 60
+# Run first pass at a faster codec preset (where the codec allows it).
+fast_first_pass = False
+
+# Encode DASH video representations in GOP-aligned segments
+# and resume interrupted encodes from the first missing segment.
+dash_checkpointing = False
+# Segment length in GOPs.
+dash_checkpoint_segment_gops = 6
+
+# Root of scratch directories for encoder intermediates (tmpfs or fast NVMe).
+# If None, pyimglib-scratch in the system temporary directory is used.
+scratch_dir = None
+# Bytes reserved by running jobs at once. New jobs wait for free space.
+# If None, there is no limit.
+scratch_quota = None
+
+# Keep an SQLite index of SRS manifests in every output directory
+# (.srs-index.sqlite), so the SRS decoder doesn't re-read and re-parse
+# manifests while it is used for bulk loading.
+srs_index = False
+
 from .transcoding import encoders
 
 # uncomment line below to enable
 # encoders.avif_encoder.AVIFEncoder.enable_tune_ssimulacra2 = True
+# encoders.srs_video_encoder.SrsVideoEncoder.generate_poster_image = True
+# encoders.srs_video_encoder.SrsVideoEncoder.generate_storyboard = True
 
 encoders.srs_image_encoder.SrsLossyImageEncoder.cl1_encoder_type = (
     encoders.avif_encoder.AVIFEncoder
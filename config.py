@@ -0,0 +1,169 @@
+import enum
+import subprocess
+
+custom_pillow_image_limits = -1
+
+use_svtav1 = False
+
+
+# if 0 or None, AVIF's multithreading is off
+# or, it's enables row-mt
+encoding_threads = 1
+dash_encoding_threads = 1
+avifdec_workers_count = 1
+av1an_aomenc_threads = 1
+
+
+class AVIF_DECODING_SPEED(enum.Enum):
+    # option disabled due incorrect decoding of lossless files
+    # FAST = enum.auto()
+    SLOW = enum.auto()
+
+
+avif_decoding_speed = AVIF_DECODING_SPEED.SLOW
+avifenc_encoding_speed = 2
+av1_cpu_usage = 4
+
+# Max image size
+# works if image optimisations is enabled
+# if value is None, set maximum possible for webp size
+MAX_SIZE = None
+
+enable_multiprocessing = True
+
+jpeg_xl_tools_path = None
+
+
+class YUV4MPEG2_LIMITED_RANGE_CORRENTION_MODES(enum.Enum):
+    NONE = enum.auto()
+    CLIPPING = enum.auto()
+    EXPAND = enum.auto()
+
+
+yuv4mpeg2_limited_range_correction = (
+    YUV4MPEG2_LIMITED_RANGE_CORRENTION_MODES.CLIPPING
+)
+
+srs_image_cl_size_limit = {0: None, 1: 2**13, 2: 2**12, 3: 2**11, 4: 2**10}
+srs_thumbnail_for_lossless_trigger_size = 4096
+
+cl3_width = 1280
+cl3_height = 720
+gop_length_seconds = 10
+
+# Ratio of CL3 transcoded video stream size to original video stream size.
+# Lesser is smaller, but worse quality.
+# Reasonable range: 0.5-1
+cl3_to_orig_ratio = 0.5
+VIDEO_CRF = 24
+GIF_VIDEOLOOP_CRF = 24
+APNG_VIDEOLOOP_CRF = VIDEO_CRF
+VIDEOLOOP_CRF = GIF_VIDEOLOOP_CRF
+tiers_min_size = [480, 240, 144, 0]
+opus_stereo_bitrate_kbps = 96
+
+allow_rewrite = False
+force_audio_transcode = False
+
+WEBP_QSCALE = 1.375
+SRS_QSCALE = 1.25
+
+dash_low_tier_crf_gap = 4
+
+# First pass statistics of two-pass video encodings are cached
+# and reused across re-runs and levels with the same scaled size.
+# If None, $XDG_CACHE_HOME/pyimglib/pass-logs is used.
+first_pass_cache_dir = None
+# Cache entries lifetime in seconds. If None, entries are never removed.
+first_pass_cache_lifetime = 7 * 24 * 60 * 60
+# Run first pass at a faster codec preset (where the codec allows it).
+fast_first_pass = False
+
+# Encode DASH video representations in GOP-aligned segments
+# and resume interrupted encodes from the first missing segment.
+dash_checkpointing = False
+# Segment length in GOPs.
+dash_checkpoint_segment_gops = 6
+
+# Root of scratch directories for encoder intermediates (tmpfs or fast NVMe).
+# If None, pyimglib-scratch in the system temporary directory is used.
+scratch_dir = None
+# Bytes reserved by running jobs at once. New jobs wait for free space.
+# If None, there is no limit.
+scratch_quota = None
+
+# Keep an SQLite index of SRS manifests in every output directory
+# (.srs-index.sqlite), so the SRS decoder doesn't re-read and re-parse
+# manifests while it is used for bulk loading.
+srs_index = False
+
+from .transcoding import encoders
+
+# uncomment line below to enable
+# encoders.avif_encoder.AVIFEncoder.enable_tune_ssimulacra2 = True
+# encoders.srs_video_encoder.SrsVideoEncoder.generate_poster_image = True
+# encoders.srs_video_encoder.SrsVideoEncoder.generate_storyboard = True
+
+encoders.srs_image_encoder.SrsLossyImageEncoder.cl1_encoder_type = (
+    encoders.avif_encoder.AVIFEncoder
+)
+encoders.srs_image_encoder.SrsLossyImageEncoder.cl2_encoder_type = (
+    encoders.avif_encoder.AVIFSubsampledEncoder
+)
+encoders.srs_image_encoder.SrsLossyImageEncoder.cl3_encoder_type = (
+    encoders.webp_encoder.WEBPEncoder
+)
+
+encoders.srs_image_encoder.SrsLosslessImageEncoder.cl1_encoder_type = (
+    encoders.jpeg_xl_encoder.JpegXlLosslessEncoder
+)
+encoders.srs_image_encoder.SrsLosslessImageEncoder.cl3_encoder_type = (
+    encoders.webp_encoder.WEBPLosslessEncoder
+)
+encoders.srs_image_encoder.SrsLosslessImageEncoder.cl3_lossy_encoder_type = (
+    encoders.webp_encoder.WEBPEncoder
+)
+encoders.srs_image_encoder.SrsLosslessImageEncoder.cl2_encoder_type = (
+    encoders.avif_encoder.AVIFSubsampledEncoder
+)
+
+png_source_encoders = {
+    "animation_encoder": encoders.dash_encoder.DASHLoopEncoder,
+    "lossless_encoder": encoders.srs_image_encoder.SrsLosslessImageEncoder,
+    "lossy_encoder": encoders.srs_image_encoder.HybridImageEncoder,
+}
+
+jpeg_source_encoders = {
+    "lossy_encoder": encoders.srs_image_encoder.HybridImageEncoder,
+    "lossless_transcoder": encoders.jpeg_recompression.JpegXlTranscoder,
+}
+
+gif_source_encoders = {
+    "lossy_encoder": encoders.jpeg_xl_encoder.JpegXlEncoder,
+    "animation_encoder": encoders.dash_encoder.DASHLoopEncoder,
+}
+
+video_encoders = {
+    "video_encoder": encoders.dash_encoder.SourceAdaptiveTranscoder
+}
+
+show_output_in_console = True
+
+jpegli_enabled = True
+
+
+def test_jpeg_li() -> bool:
+    try:
+        result = subprocess.run(["cjpegli"], stdout=subprocess.DEVNULL)
+    except FileNotFoundError:
+        return False
+    if result.returncode != 0:
+        return False
+    return True
+
+
+jpegli_enabled = jpegli_enabled and test_jpeg_li()
+
+render_svg = False
+
+ACLMMP_COMPATIBILITY_LEVEL = 3
@@ -1,5 +1,6 @@
+import mmap
+
 import PIL.Image
-import os
 from PIL import Image, ImageFile
 
 
@@ -9,11 +10,17 @@ import math
 from . import CustomDecoder
 from ..config import YUV4MPEG2_LIMITED_RANGE_CORRENTION_MODES as LIMITED_RANGE_CORRENTION_MODES
 from ..config import yuv4mpeg2_limited_range_correction as limited_range_correction
+# config imports encoders, which import common, so config goes first
+from ..common import file_type
 
 import enum
 
+import numpy
+
 FILE_SIGNATURE = b"YUV4MPEG2"
 SIGNATURE_LENGTH = len(FILE_SIGNATURE)
+FRAME_SIGNATURE = b"FRAME"
+FRAME_SIGNATURE_LENGTH = len(FRAME_SIGNATURE)
 MAX_HEADER_LINE_SIZE = 2048
 
 LIMITED_COLOR_RANGE = "XCOLORRANGE=LIMITED"
@@ -32,14 +39,101 @@ class COLOOR_SPACE(enum.Enum):
     LIMITED = enum.auto()
 
 
+MIN_LIMITED_RANGE_VALUE = 16
+MAX_LIMITED_RANGE_VALUE = 235
+
+
+def make_range_expansion_lut(min_value, max_value) -> numpy.ndarray:
+    values = (numpy.arange(256) - min_value) / (max_value - min_value) * 255
+    return numpy.clip(values, 0, 255).astype(numpy.uint8)
+
+
+LIMITED_RANGE_LUT = make_range_expansion_lut(MIN_LIMITED_RANGE_VALUE, MAX_LIMITED_RANGE_VALUE)
+
+
+def expand_limited_color_range(plane: numpy.ndarray, mode=None) -> numpy.ndarray:
+    """
+    Maps limited range plane values (16-235) to full range (0-255).
+
+    Out of range values are clipped in CLIPPING mode and raise ValueError in NONE mode.
+    In EXPAND mode, the input range is extended to the plane's own min and max values.
+    """
+    if mode is None:
+        mode = limited_range_correction
+    lut = LIMITED_RANGE_LUT
+    if mode != LIMITED_RANGE_CORRENTION_MODES.CLIPPING:
+        min_value = int(plane.min(initial=MIN_LIMITED_RANGE_VALUE))
+        max_value = int(plane.max(initial=MAX_LIMITED_RANGE_VALUE))
+        if min_value < MIN_LIMITED_RANGE_VALUE or max_value > MAX_LIMITED_RANGE_VALUE:
+            if mode == LIMITED_RANGE_CORRENTION_MODES.EXPAND:
+                lut = make_range_expansion_lut(min_value, max_value)
+            else:
+                raise ValueError(min_value if min_value < MIN_LIMITED_RANGE_VALUE else max_value)
+    return lut[plane]
+
+
 def is_Y4M(file_path):
-    file = open(file_path, 'rb')
-    header = file.read(9)
-    file.close()
-    return header == FILE_SIGNATURE
+    return file_type.sniff(file_path) is file_type.FileType.Y4M
+
+
+def _upsample_bilinear(plane: numpy.ndarray, height: int, width: int) -> numpy.ndarray:
+    """
+    Upsamples centre-sited chroma plane to (height, width) by bilinear interpolation.
+    Returns float32 array.
+    """
+    plane = plane.astype(numpy.float32)
+    for axis, size in ((0, height), (1, width)):
+        source_size = plane.shape[axis]
+        if source_size == size:
+            continue
+        factor = -(-size // source_size)
+        position = (numpy.arange(size, dtype=numpy.float32) + 0.5) / factor - 0.5
+        position = numpy.clip(position, 0, source_size - 1)
+        low = position.astype(numpy.intp)
+        high = numpy.minimum(low + 1, source_size - 1)
+        weight = position - low
+        if axis == 0:
+            weight = weight[:, numpy.newaxis]
+            plane = plane[low] * (1 - weight) + plane[high] * weight
+        else:
+            plane = plane[:, low] * (1 - weight) + plane[:, high] * weight
+    return plane
+
+
+def yuv_to_rgb(
+        y_plane: numpy.ndarray,
+        cb_plane: numpy.ndarray,
+        cr_plane: numpy.ndarray,
+        alpha_plane: numpy.ndarray | None = None
+) -> numpy.ndarray:
+    """
+    Converts full range BT.601 (JPEG) YCbCr planes to RGB(A) array.
+    Subsampled chroma planes are upsampled bilinearly.
+    """
+    height, width = y_plane.shape
+    channels = 3 if alpha_plane is None else 4
+    rgb = numpy.empty((height, width, channels), dtype=numpy.uint8)
+    y = y_plane.astype(numpy.float32)
+    cb = _upsample_bilinear(cb_plane, height, width) - 128
+    cr = _upsample_bilinear(cr_plane, height, width) - 128
+    # + 0.5 rounds to nearest on the uint8 cast
+    rgb[..., 0] = numpy.clip(y + 1.402 * cr + 0.5, 0, 255)
+    rgb[..., 1] = numpy.clip(y - 0.344136 * cb - 0.714136 * cr + 0.5, 0, 255)
+    rgb[..., 2] = numpy.clip(y + 1.772 * cb + 0.5, 0, 255)
+    if alpha_plane is not None:
+        rgb[..., 3] = alpha_plane
+    return rgb
 
 
 class Y4M_FramesStream(frames_stream.FramesStream):
+    """
+    Memory-mapped YUV4MPEG2 reader.
+
+    FRAME headers are indexed once on open, so any frame can be read
+    by its number. Plane arrays returned by frame_planes()
+    are views of the mapped file and valid until close().
+    """
+
     def __init__(self, file_path):
         super().__init__(file_path)
         self._file_path = file_path
@@ -51,7 +145,8 @@ class Y4M_FramesStream(frames_stream.FramesStream):
         self._width, self._height = 0, 0
         self._profile = SUPPORTED_COLOR_SPACES.NONE
         self._color_space = COLOOR_SPACE.FULL
-        header_raw_data = str(header).split(' ')[1:]
+        self._fps = None
+        header_raw_data = header.decode("ascii").split()[1:]
         for raw_data in header_raw_data:
             if raw_data[0] == 'W':
                 self._width = int(raw_data[1:])
@@ -78,102 +173,98 @@ class Y4M_FramesStream(frames_stream.FramesStream):
                 self._color_space = COLOOR_SPACE.LIMITED
             elif raw_data[0] == 'F':
                 _f = raw_data[1:].split(':')
-                fps = int(_f[0])/int(_f[1])
-                self._frame_time_ms = int(round(1 / fps * 1000))
+                self._fps = int(_f[0])/int(_f[1])
+                self._frame_time_ms = int(round(1 / self._fps * 1000))
         self._size = (self._width, self._height)
 
         self._plane_size = self._size[0] * self._size[1]
         self._color_size = self._size
         if self._profile == SUPPORTED_COLOR_SPACES.YUV420:
-            self._color_size = (self._size[0] // 2, self._size[1] // 2)
+            self._color_size = ((self._size[0] + 1) // 2, (self._size[1] + 1) // 2)
         elif self._profile == SUPPORTED_COLOR_SPACES.YUV422:
-            self._color_size = (self._size[0] // 2, self._size[1])
+            self._color_size = ((self._size[0] + 1) // 2, self._size[1])
+        self._color_plane_size = self._color_size[0] * self._color_size[1]
 
-        frame_size = self._plane_size + self._color_size[0] * self._color_size[1] * 2
+        self._frame_size = self._plane_size + self._color_plane_size * 2
         if self._profile == SUPPORTED_COLOR_SPACES.YUVA4444:
-            frame_size += self._plane_size
-        if os.path.getsize(file_path) > frame_size * 2:
-            self._is_animated = True
-        else:
-            self._is_animated = False
-
-    @staticmethod
-    def expand_limited_color_range(plane):
-        result_plane = bytearray(len(plane))
-        MIN_INPUT_VALUE = 16
-        MAX_INPUT_VALUE = 235
-        DIVIDER = 219
-        if limited_range_correction == LIMITED_RANGE_CORRENTION_MODES.EXPAND:
-            i = 0
-            while i < len(plane):
-                if plane[i] < MIN_INPUT_VALUE:
-                    MIN_INPUT_VALUE = plane[i]
-                    DIVIDER = MAX_INPUT_VALUE - MIN_INPUT_VALUE
-                    i = 0
-                elif plane[i] > MAX_INPUT_VALUE:
-                    MAX_INPUT_VALUE = plane[i]
-                    DIVIDER = MAX_INPUT_VALUE - MIN_INPUT_VALUE
-                    i = 0
-                else:
-                    value = (plane[i] - MIN_INPUT_VALUE) / DIVIDER * 255
-                    result_plane[i] = int(value)
-                    i += 1
-        else:
-            for i in range(len(plane)):
-                value = (plane[i] - MIN_INPUT_VALUE) / DIVIDER * 255
-                if value < 0:
-                    if limited_range_correction == LIMITED_RANGE_CORRENTION_MODES.CLIPPING:
-                        value = 0
-                    else:
-                        raise ValueError(plane[i])
-                elif value > 255:
-                    if limited_range_correction == LIMITED_RANGE_CORRENTION_MODES.CLIPPING:
-                        value = 255
-                    else:
-                        raise ValueError(plane[i])
-                result_plane[i] = int(value)
-            return bytes(result_plane)
+            self._frame_size += self._plane_size
+
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._frame_offsets = self._index_frames(len(header))
+        self._is_animated = len(self._frame_offsets) > 1
+        self._frame_index = 0
+
+    def _index_frames(self, offset: int) -> list[int]:
+        frame_offsets = []
+        file_size = len(self._mmap)
+        while offset + FRAME_SIGNATURE_LENGTH <= file_size:
+            if self._mmap[offset:offset + FRAME_SIGNATURE_LENGTH] != FRAME_SIGNATURE:
+                break
+            line_end = self._mmap.find(b"\n", offset, offset + MAX_HEADER_LINE_SIZE)
+            if line_end < 0:
+                break
+            data_offset = line_end + 1
+            if data_offset + self._frame_size > file_size:
+                break
+            frame_offsets.append(data_offset)
+            offset = data_offset + self._frame_size
+        return frame_offsets
+
+    def __len__(self):
+        return len(self._frame_offsets)
+
+    def _plane(self, offset: int, size: tuple[int, int]) -> numpy.ndarray:
+        return numpy.frombuffer(
+            self._mmap, dtype=numpy.uint8, count=size[0] * size[1], offset=offset
+        ).reshape((size[1], size[0]))
+
+    def frame_planes(self, index: int) -> tuple[numpy.ndarray, ...]:
+        """
+        Returns Y, Cb, Cr (and alpha) planes of the frame without copying.
+        """
+        offset = self._frame_offsets[index]
+        planes = [self._plane(offset, self._size)]
+        offset += self._plane_size
+        planes.append(self._plane(offset, self._color_size))
+        offset += self._color_plane_size
+        planes.append(self._plane(offset, self._color_size))
+        offset += self._color_plane_size
+        if self._profile == SUPPORTED_COLOR_SPACES.YUVA4444:
+            planes.append(self._plane(offset, self._size))
+        return tuple(planes)
+
+    def frame_array(self, index: int) -> numpy.ndarray:
+        y_plane, cb_plane, cr_plane, *alpha_plane = self.frame_planes(index)
+        if self._color_space == COLOOR_SPACE.LIMITED:
+            y_plane = expand_limited_color_range(y_plane)
+            cb_plane = expand_limited_color_range(cb_plane)
+            cr_plane = expand_limited_color_range(cr_plane)
+        return yuv_to_rgb(y_plane, cb_plane, cr_plane, *alpha_plane)
+
+    def frame(self, index: int) -> PIL.Image.Image:
+        if index < 0 or index >= len(self._frame_offsets):
+            raise IndexError(index)
+        return Image.fromarray(self.frame_array(index))
 
     def next_frame(self) -> PIL.Image.Image:
         if self._profile != SUPPORTED_COLOR_SPACES.NONE:
-            frame_flag = self._file.read(6)
-            if frame_flag != b"FRAME\n":
-                raise EOFError("frame flag = {}".format(frame_flag))
-            Y_plane = self._file.read(self._plane_size)
-            if self._color_space == COLOOR_SPACE.LIMITED:
-                Y_plane = self.expand_limited_color_range(Y_plane)
-            Y_channel = Image.frombytes("L", self._size, Y_plane, "raw", "L", 0, 1)
-            Cb_plane = b""
-            Cr_plane = b""
-            if self._profile == SUPPORTED_COLOR_SPACES.YUV444 or self._profile == SUPPORTED_COLOR_SPACES.YUVA4444:
-                Cb_plane = self._file.read(self._plane_size)
-                Cr_plane = self._file.read(self._plane_size)
-            else:
-                current_plane_size = self._color_size[0] * self._color_size[1]
-                if (self._size[0] & 1) == 1 or (self._size[1] & 1) == 1:
-                    current_plane_size += self._color_size[1]
-                color_planes_buffer = self._file.read(current_plane_size * 2)
-                Cb_plane = color_planes_buffer[:len(color_planes_buffer)//2]
-                Cr_plane = color_planes_buffer[len(color_planes_buffer)//2:]
-                if len(color_planes_buffer) > (self._color_size[0] * self._color_size[1] * 2):
-                    self._color_size = (self._color_size[0] + 1, self._color_size[1])
-
-            if self._color_space == COLOOR_SPACE.LIMITED:
-                Cb_plane = self.expand_limited_color_range(Cb_plane)
-                Cr_plane = self.expand_limited_color_range(Cr_plane)
-
-            Cb_channel = Image.frombytes("L", self._color_size, Cb_plane, "raw", "L", 0, 1)
-            Cr_channel = Image.frombytes("L", self._color_size, Cr_plane, "raw", "L", 0, 1)
-            if self._profile != SUPPORTED_COLOR_SPACES.YUV444 and self._profile != SUPPORTED_COLOR_SPACES.YUVA4444:
-                Cb_channel = Cb_channel.resize(self._size)
-                Cr_channel = Cr_channel.resize(self._size)
-
-            image = Image.merge("YCbCr", (Y_channel, Cb_channel, Cr_channel))
-            if self._profile == SUPPORTED_COLOR_SPACES.YUVA4444:
-                alpha_channel = Image.frombytes("L", self._size, self._file.read(self._plane_size), "raw", "L", 0, 1)
-                image = image.convert(mode="RGB")
-                image.putalpha(alpha_channel)
+            if self._frame_index >= len(self._frame_offsets):
+                raise EOFError("end of stream")
+            image = self.frame(self._frame_index)
+            self._frame_index += 1
             return image
 
+    def seek(self, *, frame: int | None = None, time: float | None = None):
+        if frame is None:
+            frame = int(round(time * self._fps)) if self._fps else 0
+        if frame < 0 or frame >= len(self._frame_offsets):
+            raise IndexError(frame)
+        self._frame_index = frame
+
     def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            # plane views are still referenced, mapping is released with them
+            pass
         self._file.close()
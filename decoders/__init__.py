@@ -10,8 +10,11 @@ from . import jpeg,\
     YUV4MPEG2,\
     jpeg_xl,\
     frames_stream,\
+    size,\
+    probe,\
     video,\
     srs,\
     YUV4MPEG2
 
 from .common import open_image, get_image_format
+from .probe import probe_image, ImageInfo
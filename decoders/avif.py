@@ -1,85 +1,89 @@
-import tempfile
-import subprocess
-from . import YUV4MPEG2
+import concurrent.futures
+import threading
+from . import ffmpeg_frames_stream
 from .. import config
+from ..common import file_type
+from .size import decode_scale
 import PIL.Image
+import pillow_heif
 import asyncio
-import abc
 
 
 def is_avif(file):
-    file = open(file, 'rb')
-    file.seek(4)
-    header = file.read(8)
-    file.close()
-    return header in (b'ftypavif', b'ftypavis')
+    return file_type.sniff(file) in (file_type.FileType.AVIF, file_type.FileType.AVIF_SEQUENCE)
 
 
 def is_animated_avif(file):
-    file = open(file, 'rb')
-    file.seek(4)
-    header = file.read(8)
-    file.close()
-    return header == b'ftypavis'
-
-
-def decode(file):
-    return asyncio.run(async_decode(file, None))
-
-
-async def async_decode(file, process_set_callback):
-    if not is_avif(file):
+    return file_type.sniff(file) is file_type.FileType.AVIF_SEQUENCE
+
+
+def open_thumbnail(file, min_size: tuple[int, int]) -> PIL.Image.Image | None:
+    """
+    Returns the smallest thumbnail item of the primary image
+    which is at least min_size, or None.
+    Only the thumbnail is decoded.
+    """
+    heif_file = pillow_heif.open_heif(file)
+    image = heif_file[heif_file.primary_index]
+    best = None
+    for index in range(len(image.info["thumbnails"])):
+        thumbnail = image.get_thumbnail(index)
+        if thumbnail.size[0] >= min_size[0] and thumbnail.size[1] >= min_size[1]:
+            if best is None or thumbnail.size[0] < best.size[0]:
+                best = thumbnail
+    if best is None:
+        return None
+    return best.to_pillow()
+
+
+def decode(file, required_size=None):
+    """
+    Decodes still AVIF in process by libheif (pillow_heif).
+    If required_size is smaller than the image,
+    a large enough thumbnail item is decoded instead, when the file has it.
+
+    Image sequences are returned as frames stream,
+    decoded by ffmpeg frame by frame through a pipe.
+    """
+    source_type = file_type.sniff(file)
+    if source_type is file_type.FileType.AVIF_SEQUENCE:
+        return ffmpeg_frames_stream.FFmpegFramesStream(file, size=required_size)
+    elif source_type is not file_type.FileType.AVIF:
         raise Exception
-
-    class BaseEncode(abc.ABC):
-        def __init__(self, callback=None):
-            self._tmp_file = None
-            self.process = None
-            self._suffix = None
-            self._callback = callback
-
-        @abc.abstractmethod
-        def return_result(self):
-            pass
-
-        async def encode(self, file):
-            self._tmp_file = tempfile.NamedTemporaryFile(mode='rb', delete=True, suffix=self._suffix)
-            commandline = ['avifdec', '-j', str(config.avifdec_workers_count), str(file), self._tmp_file.name]
-            self.process = await asyncio.create_subprocess_exec(*commandline)
-            if self._callback is not None:
-                self._callback(self.process)
-            returncode = await self.process.wait()
-            return self.return_result()
-
-        def close(self):
-            self._tmp_file.close()
-
-    class FastEncode(BaseEncode):
-        def return_result(self):
-            return YUV4MPEG2.Y4M_FramesStream(self._tmp_file.name)
-
-        def __init__(self, callback):
-            BaseEncode.__init__(self, callback)
-            self._suffix = '.y4m'
-
-        async def encode(self, file):
-            return await BaseEncode.encode(self, file)
-
-    class SlowEncode(BaseEncode):
-        def return_result(self):
-            return PIL.Image.open(self._tmp_file.name)
-
-        def __init__(self, callback):
-            BaseEncode.__init__(self, callback)
-            self._suffix = '.png'
-
-        async def encode(self, file):
-            return await BaseEncode.encode(self, file)
-
-    async def _encode(encoder, file, callback):
-        _encoder = encoder(callback)
-        result = await _encoder.encode(file)
-        _encoder.close()
-        return result
-
-    return await _encode(SlowEncode, file, process_set_callback)
+    heif_file = pillow_heif.open_heif(file)
+    scale = decode_scale(heif_file.size, required_size)
+    if scale < 1:
+        thumbnail = open_thumbnail(
+            file, (int(heif_file.size[0] * scale), int(heif_file.size[1] * scale))
+        )
+        if thumbnail is not None:
+            return thumbnail
+    return heif_file.to_pillow()
+
+
+async def async_decode(file, required_size=None):
+    return await asyncio.to_thread(decode, file, required_size)
+
+
+_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(config.avifdec_workers_count or 1, 1),
+                thread_name_prefix="avif-decoder"
+            )
+    return _executor
+
+
+def decode_batch(files, required_size=None) -> list:
+    """
+    Decodes files in the thread pool. libheif releases GIL while decoding,
+    so files are decoded in parallel.
+    """
+    executor = get_executor()
+    return list(executor.map(lambda file: decode(file, required_size), files))
@@ -1,33 +1,84 @@
 import PIL.Image
 from . import jpeg,\
+    webp,\
     svg,\
     avif,\
     jpeg_xl,\
     video,\
     srs,\
     YUV4MPEG2
+from .size import reduce_factor
+from ..common.file_type import FileType, VIDEO_TYPES, sniff
 
 import pillow_heif
 pillow_heif.register_heif_opener()
 pillow_heif.register_avif_opener()
 
 
-def open_image(file_path, required_size=None):
-    if jpeg.is_JPEG(file_path):
-        decoder = jpeg.JPEGDecoder(file_path)
-        decoded_jpg = decoder.decode(required_size)
-        img = PIL.Image.open(decoded_jpg.stdout)
+def _open_jpeg(file_path, required_size):
+    decoder = jpeg.JPEGDecoder(file_path)
+    return decoder.decode(required_size)
+
+
+def _open_pil_image(file_path, required_size):
+    return PIL.Image.open(file_path)
+
+
+# modes supported by PIL.Image.reduce()
+REDUCIBLE_MODES = {"L", "LA", "RGB", "RGBA", "I", "F", "I;16"}
+
+
+def _open_png(file_path, required_size):
+    img = PIL.Image.open(file_path)
+    if required_size is None or getattr(img, "is_animated", False) or img.mode not in REDUCIBLE_MODES:
         return img
-    # elif avif.is_avif(file_path):
-    #     return avif.decode(file_path)
-    elif YUV4MPEG2.is_Y4M(file_path):
-        return YUV4MPEG2.Y4M_FramesStream(file_path)
-    elif jpeg_xl.is_JPEG_XL(file_path):
-        return jpeg_xl.decode(file_path)
-    elif video.is_video(file_path):
-        return video.open_video(file_path)
-    elif srs.is_ACLMMP_SRS(file_path):
-        return srs.decode(file_path)
+    factor = reduce_factor(img.size, required_size)
+    if factor > 1:
+        return img.reduce(factor)
+    return img
+
+
+OPENERS = {
+    FileType.JPEG: _open_jpeg,
+    FileType.Y4M: lambda file_path, required_size: YUV4MPEG2.Y4M_FramesStream(file_path),
+    FileType.JPEG_XL: jpeg_xl.decode,
+    FileType.SRS: lambda file_path, required_size: srs.decode(file_path),
+    FileType.SVG: svg.decode,
+    FileType.AVIF: avif.decode,
+    FileType.AVIF_SEQUENCE: avif.decode,
+    FileType.PNG: _open_png,
+    FileType.GIF: _open_pil_image,
+    FileType.WEBP: webp.decode,
+}
+for _video_type in VIDEO_TYPES:
+    OPENERS[_video_type] = lambda file_path, required_size: video.open_video(file_path)
+
+FORMAT_NAMES = {
+    FileType.JPEG: "jpeg",
+    FileType.AVIF: "avif",
+    FileType.AVIF_SEQUENCE: "avif",
+    FileType.Y4M: "y4m",
+    FileType.JPEG_XL: "jpeg xl",
+    FileType.MP4: "video",
+    FileType.MKV: "video",
+    FileType.MPD: "video",
+    FileType.SRS: "SRS sheet",
+    FileType.PNG: "png",
+    FileType.GIF: "gif",
+    FileType.WEBP: "webp",
+    FileType.SVG: "svg",
+}
+
+
+def open_image(file_path, required_size=None):
+    """
+    If required_size is given, the image may be decoded smaller
+    than its full size, but at least as big as it fits in required_size.
+    Each format takes its cheapest way to decode at that size.
+    """
+    file_type = sniff(file_path)
+    if file_type is not None:
+        return OPENERS[file_type](file_path, required_size)
     else:
         pil_image = None
         try:
@@ -42,18 +93,9 @@ def open_image(file_path, required_size=None):
 
 
 def get_image_format(file_path) -> str:
-    if jpeg.is_JPEG(file_path):
-        return "jpeg"
-    elif avif.is_avif(file_path):
-        return "avif"
-    elif YUV4MPEG2.is_Y4M(file_path):
-        return "y4m"
-    elif jpeg_xl.is_JPEG_XL(file_path):
-        return "jpeg xl"
-    elif video.is_video(file_path):
-        return "video"
-    elif srs.is_ACLMMP_SRS(file_path):
-        return "SRS sheet"
+    file_type = sniff(file_path)
+    if file_type is not None:
+        return FORMAT_NAMES[file_type]
     else:
         pil_image = None
         try:
@@ -1,69 +1,260 @@
-import PIL.Image
+import bisect
+import queue
 import subprocess
-from . import frames_stream
+import threading
+
+import numpy
+import PIL.Image
+from . import frames_stream, YUV4MPEG2
 
 from ..common import ffmpeg
 
 from ..common.ffmpeg.parser import fps_calc
 
+RING_SIZE = 4
+
+
+# ffmpeg pixel format: PIL mode, bytes per pixel
+PIXEL_FORMATS = {
+    "rgba": ("RGBA", 4),
+    "rgb24": ("RGB", 3),
+    "gray": ("L", 1),
+    "yuv420p": ("YCbCr", None),
+}
+
+
+def fit_in_size(width: int, height: int, max_width: int, max_height: int) -> tuple[int, int]:
+    """
+    Returns size scaled down to fit in max size, preserving aspect ratio.
+    """
+    scale = min(max_width / width, max_height / height, 1)
+    return max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+
 
 class FFmpegFramesStream(frames_stream.FramesStream):
-    def __init__(self, file_name, original_filename=None):
+    """
+    Reads decoded frames from ffmpeg pipe.
+
+    Frames are read by a background thread into a ring
+    of preallocated buffers, so decoding overlaps consumer work.
+
+    Frames may be scaled down to fit in size, converted to
+    rgba, rgb24, gray or yuv420p pixel format, decimated to fps
+    and limited to the time range from start to start + duration.
+    All of it is done by ffmpeg, before frames get into the pipe.
+    """
+
+    def __init__(
+            self,
+            file_name,
+            original_filename=None,
+            ring_size=RING_SIZE,
+            size: tuple[int, int] | None = None,
+            pixel_format="rgba",
+            fps=None,
+            start: float | None = None,
+            duration: float | None = None
+    ):
         super().__init__(file_name)
         self._original_filename = original_filename
+        if pixel_format not in PIXEL_FORMATS:
+            raise NotImplementedError("pixel format not supported", pixel_format)
         data = ffmpeg.probe(file_name)
 
         video = ffmpeg.parser.find_video_stream(data, ffmpeg.parser.SPECIFY_VIDEO_STREAM.LAST)
+        self._video_index = video['index']
 
-        fps = ffmpeg.parser.get_fps(video)
+        source_fps = ffmpeg.parser.get_fps(video)
+        if fps is None or fps > source_fps:
+            fps = source_fps
+        self._fps = fps
         self._frame_time_ms = int(round(1 / fps * 1000))
 
         self._width = video["width"]
         self._height = video["height"]
+        scale_options = []
+        if size is not None:
+            width, height = fit_in_size(self._width, self._height, *size)
+            if (width, height) != (self._width, self._height):
+                self._width, self._height = width, height
+                scale_options.append('{}:{}'.format(width, height))
+        if pixel_format == "yuv420p":
+            # planes are converted to RGB as full range BT.601
+            scale_options.append('out_range=full')
+        self._scale_commandline = []
+        if scale_options:
+            self._scale_commandline = ['-vf', 'scale={}'.format(':'.join(scale_options))]
 
-        self._color_profile = "RGBA"
+        self._pixel_format = pixel_format
+        self._color_profile, bytes_per_pixel = PIXEL_FORMATS[pixel_format]
 
-        self._duration = float(data['format']['duration'])
+        self._start_time = start if start is not None else 0
+        self._duration = float(data['format']['duration']) - self._start_time
+        if duration is not None:
+            self._duration = min(self._duration, duration)
+        self._time_limit = duration
         self._is_animated = self._duration > (1 / fps)
 
-        commandline = ['ffmpeg',
-                       '-i', file_name,
-                       '-f', 'image2pipe',
-                       '-map', "0:{}".format(video['index']),
-                       '-pix_fmt', 'rgba',
-                       '-an',
-                       '-r', str(fps),
-                       '-vcodec', 'rawvideo', '-']
+        if pixel_format == "yuv420p":
+            chroma_size = ((self._width + 1) // 2) * ((self._height + 1) // 2)
+            self._frame_shape = (self._width * self._height + chroma_size * 2,)
+        elif bytes_per_pixel == 1:
+            self._frame_shape = (self._height, self._width)
+        else:
+            self._frame_shape = (self._height, self._width, bytes_per_pixel)
+        self._frame_size = int(numpy.prod(self._frame_shape))
+        self._ring = [numpy.empty(self._frame_shape, dtype=numpy.uint8) for i in range(ring_size)]
+        self._free_buffers = queue.Queue()
+        self._filled_buffers = queue.Queue()
+        self._current_buffer = None
+
+        # keyframe times are shifted by the container start time
+        self._time_offset = float(data['format'].get('start_time', 0))
+        self._stream_start = 0
+        self._frames_read = 0
+        self._start(self._make_commandline(self._start_time))
+
+    def _make_commandline(self, start_time: float) -> list[str]:
+        commandline = ['ffmpeg']
+        if start_time > 0:
+            commandline += ['-ss', str(start_time)]
+        commandline += ['-i', self._file_path]
+        if self._time_limit is not None:
+            commandline += ['-t', str(self._time_limit - (start_time - self._start_time))]
+        commandline += ['-f', 'image2pipe',
+                        '-map', "0:{}".format(self._video_index)]
+        commandline += self._scale_commandline
+        commandline += ['-pix_fmt', self._pixel_format,
+                        '-an',
+                        '-r', str(self._fps),
+                        '-vcodec', 'rawvideo', '-']
+        return commandline
+
+    def _start(self, commandline):
         self.process = subprocess.Popen(commandline, stdout=subprocess.PIPE)
+        for i in range(len(self._ring)):
+            self._free_buffers.put(i)
+        self._reader = threading.Thread(target=self._read_frames, daemon=True)
+        self._reader.start()
+
+    def _read_frames(self):
+        stdout = self.process.stdout
+        while True:
+            index = self._free_buffers.get()
+            if index is None:
+                return
+            buffer = memoryview(self._ring[index]).cast("B")
+            filled = 0
+            try:
+                while filled < self._frame_size:
+                    read_size = stdout.readinto(buffer[filled:])
+                    if not read_size:
+                        break
+                    filled += read_size
+            except (ValueError, OSError):
+                # pipe is closed
+                pass
+            if filled < self._frame_size:
+                self._filled_buffers.put(None)
+                return
+            self._filled_buffers.put(index)
+
+    def _stop(self):
+        self.process.terminate()
+        self._free_buffers.put(None)
+        self._reader.join()
+        self.process.stdout.close()
+        self.process.wait()
+        self._free_buffers = queue.Queue()
+        self._filled_buffers = queue.Queue()
+        self._current_buffer = None
+
+    def next_frame_array(self) -> numpy.ndarray:
+        """
+        Returns the next frame as uint8 array:
+        (height, width, channels) for rgba and rgb24,
+        (height, width) for gray and flat Y, U, V planes for yuv420p.
+
+        The array is a view of a ring buffer, it is valid
+        until the next call. Copy it to keep the frame longer.
+        """
+        if self._current_buffer is not None:
+            self._free_buffers.put(self._current_buffer)
+            self._current_buffer = None
+        index = self._filled_buffers.get()
+        if index is None:
+            # keep end of stream mark for next calls
+            self._filled_buffers.put(None)
+            raise EOFError()
+        self._current_buffer = index
+        self._frames_read += 1
+        return self._ring[index]
+
+    def frame_planes(self, frame: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """
+        Splits yuv420p frame array into Y, U and V plane views.
+        """
+        chroma_size = ((self._width + 1) // 2, (self._height + 1) // 2)
+        luma_plane_size = self._width * self._height
+        chroma_plane_size = chroma_size[0] * chroma_size[1]
+        y_plane = frame[:luma_plane_size].reshape((self._height, self._width))
+        u_plane = frame[luma_plane_size:luma_plane_size + chroma_plane_size]
+        v_plane = frame[luma_plane_size + chroma_plane_size:]
+        return (
+            y_plane,
+            u_plane.reshape((chroma_size[1], chroma_size[0])),
+            v_plane.reshape((chroma_size[1], chroma_size[0]))
+        )
 
     def next_frame(self) -> PIL.Image.Image:
-        frame_size = 0
-        if self._color_profile == "RGBA":
-            frame_size = self._width * self._height * 4
-        else:
-            raise NotImplementedError("color profile not supported", self._color_profile)
-
-        if frame_size == 0:
-            raise ValueError()
-
-        buffer = self.process.stdout.read(frame_size)
-
-        if len(buffer) > 0:
-            return PIL.Image.frombytes(
-                self._color_profile,
-                (self._width, self._height),
-                buffer,
-                "raw",
-                self._color_profile,
-                0,
-                1
-            )
+        frame = self.next_frame_array()
+        if self._pixel_format == "yuv420p":
+            frame = YUV4MPEG2.yuv_to_rgb(*self.frame_planes(frame))
         else:
-            raise EOFError()
+            # fromarray shares memory with the ring buffer
+            frame = frame.copy()
+        return PIL.Image.fromarray(frame)
+
+    @property
+    def position(self) -> float:
+        """
+        Time of the next frame in seconds from the stream start.
+        """
+        return self._stream_start + self._frames_read / self._fps
+
+    def _keyframe_before(self, time: float) -> float:
+        keyframes = ffmpeg.keyframes(self._file_path, self._video_index)
+        index = bisect.bisect_right(keyframes, self._time_offset + self._start_time + time) - 1
+        if index < 0:
+            return 0
+        return keyframes[index] - self._time_offset - self._start_time
+
+    def _restart(self, time: float):
+        self._stop()
+        self._stream_start = time
+        self._frames_read = 0
+        self._start(self._make_commandline(self._start_time + time))
+
+    def seek(self, *, frame: int | None = None, time: float | None = None):
+        """
+        Decodes forward to the target if no keyframe lies between it
+        and the current position. Otherwise ffmpeg is restarted
+        with input seeking, which decodes from the keyframe before the target.
+        """
+        if frame is None:
+            frame = int(round(time * self._fps))
+        position = self._frames_read + int(round(self._stream_start * self._fps))
+        if frame < position or self._keyframe_before(frame / self._fps) > self.position:
+            self._restart(frame / self._fps)
+            return
+        try:
+            for i in range(frame - position):
+                self.next_frame_array()
+        except EOFError:
+            pass
 
     def close(self):
-        self.process.stdout.close()
-        self.process.terminate()
+        self._stop()
 
     @property
     def filename(self):
@@ -30,6 +30,29 @@ class FramesStream(abc.ABC):
     def format(self):
         return "VIDEO"
 
+    def seek(self, *, frame: int | None = None, time: float | None = None):
+        """
+        Moves the stream to the frame number or time (in seconds from
+        the stream start), so the next call of next_frame() returns it.
+        Streams which can't seek raise NotImplementedError.
+        """
+        raise NotImplementedError()
+
+    def frames_at(self, times: list[float]) -> list[PIL.Image.Image]:
+        """
+        Returns frames at times (in seconds from the stream start).
+        Times are served in ascending order, so the stream only moves
+        forward between them, results keep the order of times.
+        """
+        frames: list[PIL.Image.Image | None] = [None] * len(times)
+        last_time, last_frame = None, None
+        for index in sorted(range(len(times)), key=lambda i: times[i]):
+            if times[index] != last_time:
+                self.seek(time=times[index])
+                last_time, last_frame = times[index], self.next_frame()
+            frames[index] = last_frame
+        return frames
+
     @abc.abstractmethod
     def next_frame(self) -> PIL.Image.Image:
         pass
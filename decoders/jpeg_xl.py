@@ -1,20 +1,115 @@
-import tempfile
+import mmap
 import subprocess
+
+import numpy
 from PIL import Image
 
+from ..common import file_type, scratch
+from ..common.init_segment import iter_boxes
+from .probe import probe_image
+from .size import reduce_factor
+
+try:
+    # registers in-process JPEG XL decoder in Pillow
+    import pillow_jxl
+except ImportError:
+    pillow_jxl = None
+
+DOWNSAMPLING_FACTORS = (1, 2, 4, 8)
+# PAM tuple type: Pillow mode
+PAM_MODES = {
+    b"GRAYSCALE": "L",
+    b"GRAYSCALE_ALPHA": "LA",
+    b"RGB": "RGB",
+    b"RGB_ALPHA": "RGBA",
+}
+
 
 def is_JPEG_XL(file_path):
-    file = open(file_path, 'rb')
-    header = file.read(7)
-    file.close()
-    return header == b'\x00\x00\x00\x0cJXL' or header[:2] == b'\xff\x0a'
-
-
-def decode(file):
-    tmp_file = tempfile.NamedTemporaryFile(mode='rb', delete=True, suffix='.png')
-    subprocess.run([
-        "djxl",
-        str(file),
-        tmp_file.name
-    ])
-    return Image.open(tmp_file)
+    return file_type.sniff(file_path) is file_type.FileType.JPEG_XL
+
+
+def read_pam(data: bytes) -> Image.Image:
+    """
+    Reads 8 bit PAM image without copying pixels.
+    """
+    if data[:2] != b"P7":
+        raise ValueError("not a PAM image", data[:2])
+    header_end = data.index(b"ENDHDR\n") + len(b"ENDHDR\n")
+    fields = dict()
+    for line in data[:header_end].splitlines()[1:-1]:
+        if line and not line.startswith(b"#"):
+            key, value = line.split(maxsplit=1)
+            fields[key] = value.strip()
+    width, height = int(fields[b"WIDTH"]), int(fields[b"HEIGHT"])
+    mode = PAM_MODES[fields[b"TUPLTYPE"]]
+    if int(fields[b"MAXVAL"]) != 255:
+        raise ValueError("only 8 bit samples are supported", fields[b"MAXVAL"])
+    pixels = numpy.frombuffer(data, dtype=numpy.uint8, count=width * height * len(mode), offset=header_end)
+    return Image.frombuffer(mode, (width, height), pixels, "raw", mode, 0, 1)
+
+
+def _decode_png(file, downsampling: int) -> Image.Image:
+    with scratch.job() as scratch_job:
+        output_file = scratch_job.file(".png")
+        commandline = ["djxl", str(file), str(output_file)]
+        if downsampling > 1:
+            commandline += ["--downsampling={}".format(downsampling)]
+        subprocess.run(commandline, capture_output=True).check_returncode()
+        image = Image.open(output_file)
+        image.load()
+    return image
+
+
+def decode(file, required_size=None) -> Image.Image:
+    """
+    Decodes by the in-process binding (pillow_jxl), if it is installed
+    and the full size is required. Otherwise djxl streams uncompressed
+    PAM through stdout, downsampled by the largest factor
+    which keeps the image at least as big as required_size allows.
+    Images with more than 8 bits per sample (or unreadable headers)
+    are decoded through PNG, so the extra precision is kept
+    where Pillow can hold it.
+    """
+    try:
+        info = probe_image(file)
+    except ValueError:
+        info = None
+    factor = 1
+    if required_size is not None and info is not None:
+        factor = reduce_factor(info.size, required_size, DOWNSAMPLING_FACTORS)
+    if factor == 1 and pillow_jxl is not None:
+        return Image.open(file)
+    if info is None or info.bit_depth > 8:
+        return _decode_png(file, factor)
+    commandline = [
+        "djxl", str(file), "-",
+        "--output_format=pam",
+        "--bits_per_sample=8",
+    ]
+    if factor > 1:
+        commandline += ["--downsampling={}".format(factor)]
+    result = subprocess.run(commandline, capture_output=True)
+    result.check_returncode()
+    return read_pam(result.stdout)
+
+
+def has_jpeg_reconstruction(file) -> bool:
+    with open(file, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return any(box_type == b"jbrd" for box_type, payload, box_end in iter_boxes(data))
+
+
+def reconstruct_jpeg(file) -> bytes:
+    """
+    Restores the original JPEG bitstream of losslessly recompressed JPEG,
+    pixels are not decoded.
+    """
+    if not has_jpeg_reconstruction(file):
+        raise ValueError("file has no JPEG reconstruction data")
+    result = subprocess.run(
+        ["djxl", str(file), "-", "--output_format=jpg"],
+        capture_output=True
+    )
+    result.check_returncode()
+    return result.stdout
@@ -0,0 +1,361 @@
+import contextlib
+import dataclasses
+import mmap
+import struct
+
+from ..common import file_type, jpeg_header
+from ..common.file_type import FileType
+from ..common.init_segment import iter_boxes
+
+# header fields of every format are expected in this prefix,
+# only frame counting may walk further
+PROBE_SIZE = 64 * 1024
+
+AVIF_ALPHA_URNS = {
+    b"urn:mpeg:mpegB:cicp:systems:auxiliary:alpha",
+    b"urn:mpeg:hevc:2015:auxid:1",
+}
+JPEG_XL_CODESTREAM_SIGNATURE = b"\xff\x0a"
+JPEG_XL_RATIOS = {1: (1, 1), 2: (12, 10), 3: (4, 3), 4: (3, 2), 5: (16, 9), 6: (5, 4), 7: (2, 1)}
+
+
+@dataclasses.dataclass(frozen=True)
+class ImageInfo:
+    file_type: FileType
+    width: int
+    height: int
+    has_alpha: bool = False
+    # None if the format doesn't store frame count in its headers
+    frames: int | None = 1
+    bit_depth: int = 8
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+    @property
+    def is_animated(self) -> bool:
+        return self.frames is None or self.frames > 1
+
+
+@contextlib.contextmanager
+def _open_data(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield memoryview(source)
+    else:
+        with open(source, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+
+def _probe_jpeg(data) -> ImageInfo:
+    header = jpeg_header.scan_header(data)
+    return ImageInfo(FileType.JPEG, header.width, header.height)
+
+
+def _probe_png(data) -> ImageInfo:
+    width, height, bit_depth, color_type = struct.unpack_from(">IIBB", data, 16)
+    has_alpha = color_type in (4, 6)
+    frames = 1
+    offset = 8
+    while offset + 8 <= len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, offset)
+        if chunk_type == b"acTL":
+            frames = struct.unpack_from(">I", data, offset + 8)[0]
+        elif chunk_type == b"tRNS":
+            has_alpha = True
+        elif chunk_type in (b"IDAT", b"IEND"):
+            break
+        # length, type, data and CRC
+        offset += length + 12
+    return ImageInfo(FileType.PNG, width, height, has_alpha, frames, bit_depth)
+
+
+def _skip_gif_sub_blocks(data, offset: int) -> int:
+    while offset < len(data):
+        block_size = data[offset]
+        offset += 1 + block_size
+        if block_size == 0:
+            break
+    return offset
+
+
+def _probe_gif(data) -> ImageInfo:
+    width, height, flags = struct.unpack_from("<HHB", data, 6)
+    offset = 13
+    if flags & 0x80:
+        offset += 3 * 2 ** ((flags & 0x07) + 1)
+    frames = 0
+    has_alpha = False
+    while offset < len(data):
+        block_type = data[offset]
+        if block_type == 0x21:
+            label = data[offset + 1]
+            # graphic control extension transparency flag
+            if label == 0xf9 and data[offset + 3] & 0x01:
+                has_alpha = True
+            offset = _skip_gif_sub_blocks(data, offset + 2)
+        elif block_type == 0x2c:
+            frames += 1
+            local_flags = data[offset + 9]
+            offset += 10
+            if local_flags & 0x80:
+                offset += 3 * 2 ** ((local_flags & 0x07) + 1)
+            # LZW minimum code size
+            offset = _skip_gif_sub_blocks(data, offset + 1)
+        else:
+            # trailer or broken data
+            break
+    return ImageInfo(FileType.GIF, width, height, has_alpha, max(frames, 1))
+
+
+def _probe_webp(data) -> ImageInfo:
+    chunk_type = bytes(data[12:16])
+    if chunk_type == b"VP8 ":
+        width, height = struct.unpack_from("<HH", data, 26)
+        return ImageInfo(FileType.WEBP, width & 0x3fff, height & 0x3fff)
+    elif chunk_type == b"VP8L":
+        bits = struct.unpack_from("<I", data, 21)[0]
+        return ImageInfo(
+            FileType.WEBP,
+            (bits & 0x3fff) + 1,
+            ((bits >> 14) & 0x3fff) + 1,
+            bool(bits >> 28 & 1)
+        )
+    elif chunk_type == b"VP8X":
+        flags = data[20]
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        frames = 1
+        if flags & 0x02:
+            frames = 0
+            offset = 12
+            while offset + 8 <= len(data):
+                chunk_type, size = struct.unpack_from("<4sI", data, offset)
+                if chunk_type == b"ANMF":
+                    frames += 1
+                offset += 8 + size + (size & 1)
+        return ImageInfo(FileType.WEBP, width, height, bool(flags & 0x10), frames)
+    raise ValueError("unknown WebP chunk", chunk_type)
+
+
+def _avif_properties(data, offset, end) -> dict:
+    properties = dict()
+    for box_type, payload, box_end in iter_boxes(data, offset, end):
+        if box_type == b"iprp":
+            properties.update(_avif_properties(data, payload, box_end))
+        elif box_type == b"ipco":
+            for property_type, property_payload, property_end in iter_boxes(data, payload, box_end):
+                if property_type == b"ispe" and "ispe" not in properties:
+                    # full box header
+                    properties["ispe"] = struct.unpack_from(">II", data, property_payload + 4)
+                elif property_type == b"pixi" and "pixi" not in properties:
+                    properties["pixi"] = data[property_payload + 5]
+                elif property_type == b"auxC":
+                    urn = bytes(data[property_payload + 4:property_end]).split(b"\x00")[0]
+                    if urn in AVIF_ALPHA_URNS:
+                        properties["alpha"] = True
+    return properties
+
+
+def _track_size(data, offset, end) -> tuple[int, int] | None:
+    for box_type, payload, box_end in iter_boxes(data, offset, end):
+        if box_type in (b"moov", b"trak"):
+            size = _track_size(data, payload, box_end)
+            if size is not None:
+                return size
+        elif box_type == b"tkhd":
+            # width and height are 16.16 fixed point numbers at the end of the box
+            width, height = struct.unpack_from(">II", data, box_end - 8)
+            if width and height:
+                return width >> 16, height >> 16
+    return None
+
+
+def _probe_avif(data) -> ImageInfo:
+    prefix = data[:PROBE_SIZE]
+    avif_type = file_type.sniff(bytes(prefix[:16]))
+    properties = dict()
+    for box_type, payload, box_end in iter_boxes(prefix):
+        if box_type == b"meta":
+            # full box header
+            properties = _avif_properties(prefix, payload + 4, box_end)
+    if "ispe" in properties:
+        width, height = properties["ispe"]
+    else:
+        size = _track_size(data, 0, len(data))
+        if size is None:
+            raise ValueError("AVIF image size not found")
+        width, height = size
+    return ImageInfo(
+        avif_type,
+        width,
+        height,
+        properties.get("alpha", False),
+        1 if avif_type is FileType.AVIF else None,
+        properties.get("pixi", 8)
+    )
+
+
+class _BitReader:
+    """
+    Reads JPEG XL header fields, least significant bits first.
+    """
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._position = 0
+
+    def bits(self, count: int) -> int:
+        value = 0
+        for i in range(count):
+            byte = self._data[self._position >> 3]
+            value |= ((byte >> (self._position & 7)) & 1) << i
+            self._position += 1
+        return value
+
+    def bool(self) -> bool:
+        return bool(self.bits(1))
+
+    def u32(self, *distributions: tuple[int, int]) -> int:
+        """
+        Each distribution is (bits count, offset), (0, value) is a constant.
+        """
+        bits_count, offset = distributions[self.bits(2)]
+        return self.bits(bits_count) + offset
+
+
+def _jxl_codestream(data) -> bytes:
+    if data[:2] == JPEG_XL_CODESTREAM_SIGNATURE:
+        return bytes(data[:PROBE_SIZE])
+    codestream = b""
+    for box_type, payload, box_end in iter_boxes(data):
+        if box_type == b"jxlc":
+            return bytes(data[payload:min(box_end, payload + PROBE_SIZE)])
+        elif box_type == b"jxlp":
+            # partial codestream box starts with its index
+            codestream += bytes(data[payload + 4:box_end])
+            if len(codestream) >= PROBE_SIZE:
+                break
+    return codestream
+
+
+def _jxl_size(reader: _BitReader) -> tuple[int, int]:
+    div8 = reader.bool()
+    if div8:
+        height = (reader.bits(5) + 1) * 8
+    else:
+        height = reader.u32((9, 1), (13, 1), (18, 1), (30, 1))
+    ratio = reader.bits(3)
+    if ratio != 0:
+        numerator, denominator = JPEG_XL_RATIOS[ratio]
+        return height * numerator // denominator, height
+    if div8:
+        width = (reader.bits(5) + 1) * 8
+    else:
+        width = reader.u32((9, 1), (13, 1), (18, 1), (30, 1))
+    return width, height
+
+
+def _probe_jpeg_xl(data) -> ImageInfo:
+    codestream = _jxl_codestream(data)
+    if codestream[:2] != JPEG_XL_CODESTREAM_SIGNATURE:
+        raise ValueError("JPEG XL codestream not found")
+    reader = _BitReader(codestream[2:])
+    width, height = _jxl_size(reader)
+    # ImageMetadata
+    if reader.bool():
+        # all default
+        return ImageInfo(FileType.JPEG_XL, width, height)
+    animated = False
+    if reader.bool():
+        # extra fields
+        reader.bits(3)
+        if reader.bool():
+            _jxl_size(reader)
+        if reader.bool():
+            # preview header
+            div8 = reader.bool()
+            if div8:
+                reader.u32((0, 16), (0, 32), (5, 1), (9, 33))
+            else:
+                reader.u32((6, 1), (8, 65), (10, 321), (12, 1345))
+            if reader.bits(3) == 0:
+                if div8:
+                    reader.u32((0, 16), (0, 32), (5, 1), (9, 33))
+                else:
+                    reader.u32((6, 1), (8, 65), (10, 321), (12, 1345))
+        animated = reader.bool()
+        if animated:
+            reader.u32((0, 100), (0, 1000), (10, 1), (30, 1))
+            reader.u32((0, 1), (0, 1001), (8, 1), (10, 1))
+            reader.u32((0, 0), (3, 0), (16, 0), (32, 0))
+            reader.bool()
+    if reader.bool():
+        # float samples
+        bit_depth = reader.u32((0, 32), (0, 16), (0, 24), (6, 1))
+        reader.bits(4)
+    else:
+        bit_depth = reader.u32((0, 8), (0, 10), (0, 12), (6, 1))
+    # modular 16 bit buffers
+    reader.bool()
+    has_alpha = False
+    if reader.u32((0, 0), (0, 1), (4, 2), (12, 1)) > 0:
+        # the first extra channel is alpha by default, or its type is 0
+        has_alpha = reader.bool() or reader.u32((0, 0), (0, 1), (4, 2), (6, 18)) == 0
+    return ImageInfo(FileType.JPEG_XL, width, height, has_alpha, None if animated else 1, bit_depth)
+
+
+def _probe_y4m(data) -> ImageInfo:
+    header_end = bytes(data[:PROBE_SIZE]).index(b"\n") + 1
+    width, height = 0, 0
+    has_alpha = False
+    chroma_size = None
+    for field in bytes(data[:header_end]).decode("ascii").split()[1:]:
+        if field[0] == "W":
+            width = int(field[1:])
+        elif field[0] == "H":
+            height = int(field[1:])
+        elif field[0] == "C":
+            has_alpha = field == "C444alpha"
+            chroma_size = field[1:4]
+    plane_size = width * height
+    if chroma_size == "420":
+        frame_size = plane_size + ((width + 1) // 2) * ((height + 1) // 2) * 2
+    elif chroma_size == "422":
+        frame_size = plane_size + ((width + 1) // 2) * height * 2
+    else:
+        frame_size = plane_size * 3
+    if has_alpha:
+        frame_size += plane_size
+    # frame headers are expected without parameters
+    frames = (len(data) - header_end) // (frame_size + len(b"FRAME\n"))
+    return ImageInfo(FileType.Y4M, width, height, has_alpha, frames)
+
+
+PROBES = {
+    FileType.JPEG: _probe_jpeg,
+    FileType.PNG: _probe_png,
+    FileType.GIF: _probe_gif,
+    FileType.WEBP: _probe_webp,
+    FileType.AVIF: _probe_avif,
+    FileType.AVIF_SEQUENCE: _probe_avif,
+    FileType.JPEG_XL: _probe_jpeg_xl,
+    FileType.Y4M: _probe_y4m,
+}
+
+
+def probe_image(source) -> ImageInfo:
+    """
+    Reads image size, alpha channel presence, frame count and bit depth
+    from headers of a file path or bytes-like object.
+    Pixels are never decoded.
+    """
+    with _open_data(source) as data:
+        source_type = file_type.sniff(bytes(data[:file_type.SNIFF_SIZE]))
+        if source_type not in PROBES:
+            raise ValueError("format is not supported", source_type)
+        try:
+            return PROBES[source_type](data)
+        except (struct.error, IndexError) as e:
+            raise ValueError("truncated or broken header") from e
@@ -0,0 +1,28 @@
+def decode_scale(size: tuple[int, int], required_size: tuple[int, int] | None) -> float:
+    """
+    Returns the scale which fits size in required_size.
+    Images are never upscaled, so the scale is 1 at most.
+    """
+    if required_size is None:
+        return 1
+    return min(required_size[0] / size[0], required_size[1] / size[1], 1)
+
+
+def reduce_factor(
+        size: tuple[int, int],
+        required_size: tuple[int, int] | None,
+        factors=None
+) -> int:
+    """
+    Returns the largest downscale factor (of factors, if given)
+    which keeps the image at least as big as required_size allows.
+    """
+    scale = decode_scale(size, required_size)
+    max_factor = max(int(1 / scale), 1)
+    if factors is None:
+        return max_factor
+    factor = 1
+    for _factor in factors:
+        if _factor <= max_factor:
+            factor = max(factor, _factor)
+    return factor
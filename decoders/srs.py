@@ -1,25 +1,172 @@
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+import typing
+
 from .. import config
-from . import ffmpeg_frames_stream
+from . import ffmpeg_frames_stream, video as video_decoder
 from .common import open_image
+from .probe import probe_image
+import io
 import pathlib
 import PIL.Image
 from .. import ACLMMP
+from ..common import file_type, srs_index
+
+logger = logging.getLogger(__name__)
 
 SRS_FILE_HEADER = "CLSRS"
+PROGRESSIVE_WORKERS_COUNT = 4
+
+_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=PROGRESSIVE_WORKERS_COUNT,
+                thread_name_prefix="srs-decoder"
+            )
+    return _executor
 
 
 class ClImage:
-    def __init__(self, dir: pathlib.Path, content, img_metadata, levels):
+    def __init__(self, dir: pathlib.Path, content, img_metadata, levels, level_sizes=None):
         self._dir = dir
         self.content = content
         self.img_metadata = img_metadata
         self._levels = levels
         self._levels_sorted = list(self._levels.keys())
         self._levels_sorted.sort(reverse=True)
+        # manifest keys are strings, levels keys may be numbers
+        self._level_sizes: dict = dict()
+        if level_sizes is not None:
+            for level in self._levels:
+                if str(level) in level_sizes:
+                    self._level_sizes[level] = tuple(level_sizes[str(level)])
+
+    def level_size(self, level) -> tuple[int, int] | None:
+        """
+        Returns level image size, recorded in the manifest
+        or probed from the file headers (and cached).
+        """
+        if level not in self._level_sizes:
+            try:
+                self._level_sizes[level] = probe_image(self._dir.joinpath(self._levels[level])).size
+            except (ValueError, OSError):
+                self._level_sizes[level] = None
+        return self._level_sizes[level]
+
+    def level_sizes(self) -> dict:
+        return {level: self.level_size(level) for level in self._levels}
+
+    def best_level_for(self, size: tuple[int, int], accepted_formats=None):
+        """
+        Returns the smallest level which fits in size without upscaling,
+        or the biggest one if all levels are smaller.
+        accepted_formats is a set of FileType, levels of other formats are skipped.
+        """
+        candidates = []
+        for level in self._levels:
+            if accepted_formats is not None and \
+                    file_type.sniff(self._dir.joinpath(self._levels[level])) not in accepted_formats:
+                continue
+            level_size = self.level_size(level)
+            if level_size is not None:
+                candidates.append((level_size[0] * level_size[1], level, level_size))
+        if not candidates:
+            return None
+        candidates.sort(key=lambda candidate: candidate[0])
+        for area, level, level_size in candidates:
+            if level_size[0] >= size[0] or level_size[1] >= size[1]:
+                return level
+        return candidates[-1][1]
 
     def load_thumbnail(self, required_size=None):
-        min_level = self._levels_sorted[0]
-        return open_image(self._dir.joinpath(self._levels[min_level]), required_size)
+        level = self._levels_sorted[0]
+        if required_size is not None:
+            best_level = self.best_level_for(required_size)
+            if best_level is not None:
+                level = best_level
+        return open_image(self._dir.joinpath(self._levels[level]), required_size)
+
+    def _decode_level(self, level, required_size):
+        image = open_image(self._dir.joinpath(self._levels[level]), required_size)
+        if isinstance(image, PIL.Image.Image):
+            # Pillow decodes lazily, force decoding in the worker thread
+            image.load()
+        return level, image
+
+    def iter_progressive(self, required_size=None):
+        """
+        Decodes levels in the thread pool and yields (level, image)
+        as decodes finish, from CL3 to CL1. A level is yielded only if it is
+        better than the already yielded one.
+        Pending decodes are cancelled when the generator is closed.
+        """
+        done = queue.Queue()
+        decode = _ProgressiveDecode(self, required_size, done.put)
+        decode.start()
+        best_level = None
+        try:
+            for _ in range(decode.levels_count):
+                future = done.get()
+                if future.cancelled():
+                    continue
+                level = decode.level_of(future)
+                if best_level is not None and level >= best_level:
+                    continue
+                try:
+                    level, image = future.result()
+                except Exception as e:
+                    logger.warning("Level {} of {} decoding failed: {}".format(level, self._dir, e))
+                    continue
+                best_level = level
+                decode.cancel_worse(level)
+                yield level, image
+        finally:
+            decode.close()
+        if best_level is None:
+            raise OSError("no image level could be decoded")
+
+    async def aiter_progressive(self, required_size=None):
+        """
+        Asynchronous version of iter_progressive.
+        """
+        loop = asyncio.get_running_loop()
+        done = asyncio.Queue()
+        decode = _ProgressiveDecode(
+            self,
+            required_size,
+            lambda future: loop.call_soon_threadsafe(done.put_nowait, future)
+        )
+        decode.start()
+        best_level = None
+        try:
+            for _ in range(decode.levels_count):
+                future = await done.get()
+                if future.cancelled():
+                    continue
+                level = decode.level_of(future)
+                if best_level is not None and level >= best_level:
+                    continue
+                try:
+                    level, image = future.result()
+                except Exception as e:
+                    logger.warning("Level {} of {} decoding failed: {}".format(level, self._dir, e))
+                    continue
+                best_level = level
+                decode.cancel_worse(level)
+                yield level, image
+        finally:
+            decode.close()
+        if best_level is None:
+            raise OSError("no image level could be decoded")
 
     def progressive_lods(self) -> list[pathlib.Path]:
         lods = list()
@@ -43,37 +190,108 @@ class ClImage:
         return self._levels
 
 
+class _ProgressiveDecode:
+    """
+    Submits levels of an image to the thread pool one by one,
+    worst (and cheapest) first. The next level is submitted
+    when the previous one starts decoding, so at most one level
+    waits in the pool queue and it is cancelled on close.
+    notify is called with every finished or cancelled future.
+    """
+
+    def __init__(self, image: ClImage, required_size, notify):
+        self._image = image
+        self._required_size = required_size
+        self._notify = notify
+        self._levels = list(image._levels_sorted)
+        self.levels_count = len(self._levels)
+        self._futures: dict[concurrent.futures.Future, typing.Any] = dict()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._submit_next()
+
+    def _submit_next(self):
+        with self._lock:
+            if self._closed or not self._levels:
+                return
+            level = self._levels.pop(0)
+            try:
+                future = get_executor().submit(self._decode, level)
+            except RuntimeError as e:
+                # executor is shut down
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+            self._futures[future] = level
+        future.add_done_callback(self._done)
+
+    def _decode(self, level):
+        self._submit_next()
+        return self._image._decode_level(level, self._required_size)
+
+    def _done(self, future: concurrent.futures.Future):
+        if future.cancelled():
+            # cancelled level never started, so the next one isn't submitted
+            self._submit_next()
+        self._notify(future)
+
+    def level_of(self, future: concurrent.futures.Future):
+        with self._lock:
+            return self._futures[future]
+
+    def cancel_worse(self, level):
+        with self._lock:
+            futures = [future for future, future_level in self._futures.items() if future_level > level]
+        for future in futures:
+            future.cancel()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+
 def is_ACLMMP_SRS(file_path):
-    file = open(file_path, 'r')
-    try:
-        header = file.read(16)
-    except UnicodeDecodeError:
-        file.close()
-        return False
-    file.close()
-    return SRS_FILE_HEADER in header
+    return file_type.sniff(file_path) is file_type.FileType.SRS
 
 def cover_image_parser(dir, content_metadata, stream_metadata, original_filename):
     content_metadata['original_filename'] = original_filename
     tags = dict()
     levels = None
+    level_sizes = None
     for tag in stream_metadata:
         if tag == "levels":
             levels = stream_metadata['levels']
+        elif tag == "level-sizes":
+            level_sizes = stream_metadata['level-sizes']
         else:
             tags['tag'] = stream_metadata[tag]
-    return ClImage(dir, content_metadata, tags, levels)
+    return ClImage(dir, content_metadata, tags, levels, level_sizes)
+
+def _parse_manifest(file_path: pathlib.Path):
+    content_metadata, streams_metadata, minimal_content_compatibility_level = srs_index.parse_manifest(
+        file_path, ACLMMP.srs_parser.parseJSON
+    )
+    # parsed manifests are shared, content metadata is modified by decoders
+    return dict(content_metadata), streams_metadata, minimal_content_compatibility_level
 
 def decode(file_path: pathlib.Path):
     if type(file_path) is str:
         file_path = pathlib.Path(file_path)
     dir = file_path.parent
-    fp = open(file_path, "r")
-    content_metadata, streams_metadata, minimal_content_compatibility_level = ACLMMP.srs_parser.parseJSON(fp)
-    fp.close()
+    content_metadata, streams_metadata, minimal_content_compatibility_level = _parse_manifest(file_path)
 
     if content_metadata["media-type"] == ACLMMP.srs_parser.MEDIA_TYPE.IMAGE.value:
-        return ClImage(dir, content_metadata, streams_metadata[3].tags, streams_metadata[3].levels)
+        return ClImage(
+            dir,
+            content_metadata,
+            streams_metadata[3].tags,
+            streams_metadata[3].levels,
+            content_metadata.get("level-sizes")
+        )
     elif content_metadata["media-type"] == ACLMMP.srs_parser.MEDIA_TYPE.VIDEO.value or \
          content_metadata["media-type"] == ACLMMP.srs_parser.MEDIA_TYPE.VIDEOLOOP.value:
         video = streams_metadata[0].get_compatible_files(config.ACLMMP_COMPATIBILITY_LEVEL)[0]
@@ -84,47 +302,32 @@ def decode(file_path: pathlib.Path):
         else:
             return ffmpeg_frames_stream.FFmpegFramesStream(dir.joinpath(video), original_filename=file_path)
 
-def get_file_paths(file_path):
+def poster_frame(file_path: pathlib.Path, at: float | None = None, size: tuple[int, int] | None = None):
+    """
+    Returns the poster (or cover) image of SRS video,
+    or decodes a single video frame if it has no poster.
+    """
     if type(file_path) is str:
         file_path = pathlib.Path(file_path)
     dir = file_path.parent
-    fp = open(file_path, "r")
-    content_metadata, streams_metadata, minimal_content_compatibility_level = ACLMMP.srs_parser.parseJSON(fp)
-    fp.close()
+    content_metadata, streams_metadata, minimal_content_compatibility_level = _parse_manifest(file_path)
+    for key in ('poster-image', 'cover-image'):
+        if key in content_metadata:
+            image = cover_image_parser(dir, content_metadata, content_metadata[key], file_path).load_thumbnail(size)
+            if size is not None:
+                image.thumbnail(size)
+            return image
+    video = streams_metadata[0].get_compatible_files(config.ACLMMP_COMPATIBILITY_LEVEL)[0]
+    return video_decoder.poster_frame(dir.joinpath(video), at, size)
 
-    if content_metadata["media-type"] == ACLMMP.srs_parser.MEDIA_TYPE.IMAGE.value:
-        return ClImage(
-            dir, content_metadata, streams_metadata[3].tags, streams_metadata[3].levels
-        ).get_image_file_list()
-    elif content_metadata["media-type"] == ACLMMP.srs_parser.MEDIA_TYPE.VIDEO.value or \
-            content_metadata["media-type"] == ACLMMP.srs_parser.MEDIA_TYPE.VIDEOLOOP.value:
-        file_list = list()
-        file_list_raw = list()
-        if 'poster-image' in content_metadata:
-            file_list_raw.extend(
-                cover_image_parser(
-                    dir, content_metadata, content_metadata['poster-image'], file_path
-                ).get_image_file_list()
-            )
-        elif 'cover-image' in content_metadata:
-            file_list_raw.extend(
-                cover_image_parser(
-                    dir, content_metadata, content_metadata['cover-image'], file_path
-                ).get_image_file_list()
-            )
-        for f in file_list_raw:
-            file_list.append(dir.joinpath(f))
-        video = streams_metadata[0].levels
-        for level in video:
-            file_list.append(dir.joinpath(video[level]))
-        return file_list
 
-def type_detect(file_path):
+def get_file_paths(file_path):
     if type(file_path) is str:
         file_path = pathlib.Path(file_path)
     dir = file_path.parent
-    fp = open(file_path, "r")
-    content_metadata, streams_metadata, minimal_content_compatibility_level = ACLMMP.srs_parser.parseJSON(fp)
-    fp.close()
+    return [dir.joinpath(file_name) for file_name in srs_index.files(file_path)]
 
-    return ACLMMP.srs_parser.MEDIA_TYPE(content_metadata["media-type"])
+def type_detect(file_path):
+    if type(file_path) is str:
+        file_path = pathlib.Path(file_path)
+    return ACLMMP.srs_parser.MEDIA_TYPE(srs_index.media_type(file_path))
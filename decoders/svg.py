@@ -1,64 +1,233 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import collections
+import gzip
+import hashlib
+import pathlib
 import re
 import io
 import subprocess
+import threading
 
 import PIL.Image
 from ..common.utils import InputSourceFacade
-from ..common.file_type import svg_tag, is_svg
+from ..common.file_type import svg_tag, is_svg, read_svg_prefix, GZIP_SIGNATURE
+
+try:
+    import gi
+    gi.require_version("Rsvg", "2.0")
+    from gi.repository import Gio, GLib, Rsvg
+    import cairo
+except (ImportError, ValueError):
+    Rsvg = None
 
 attributes = re.compile(r'[a-zA-Z\:]+\s?=\s?[\'\"][^\'\"]+[\'\"]')
+length_pattern = re.compile(r'([\d.]+(?:[eE][-+]?\d+)?)\s*(?:px)?')
+
+# bytes of cached rasters
+RENDER_CACHE_SIZE = 256 * 2**20
+
+
+def parse_length(value: str) -> float:
+    """
+    Parses user units or px length. Other units raise ValueError.
+    """
+    match = length_pattern.fullmatch(value.strip())
+    if match is None:
+        raise ValueError(value)
+    return float(match.group(1))
 
 
 def get_resolution(file_path):
-    data = None
-    if isinstance(file_path, (bytes, bytearray)):
-        data = file_path.decode()
-    else:
-        file = open(file_path, 'r')
-        data = file.read()
-        file.close()
-    svg_tag_data = svg_tag.search(data).group(0)
-    svg_raw_attributes = attributes.findall(svg_tag_data)
+    data = read_svg_prefix(file_path).decode(errors="replace")
+    svg_tag_match = svg_tag.search(data)
+    if svg_tag_match is None:
+        return None
+    svg_raw_attributes = attributes.findall(svg_tag_match.group(0))
     svg_attributes = dict()
     for raw_attribute in svg_raw_attributes:
-        attribute_name, attribute_value = raw_attribute.split('=')
-        if attribute_name[-1] == ' ':
-            attribute_name = attribute_name[:-1]
-        if attribute_value[0] == ' ':
-            attribute_value = attribute_value[1:]
+        attribute_name, attribute_value = raw_attribute.split('=', 1)
+        attribute_name = attribute_name.strip()
+        attribute_value = attribute_value.strip()
         if (attribute_value[0] == '\'' and attribute_value[-1] == '\'') or \
                 (attribute_value[0] == '\"' and attribute_value[-1] == '\"'):
             attribute_value = attribute_value[1:-1]
         svg_attributes[attribute_name] = attribute_value
     if 'width' in svg_attributes and 'height' in svg_attributes:
-        return (float(svg_attributes['width']), float(svg_attributes['height']))
-    elif 'viewBox' in svg_attributes:
-        values = svg_attributes['viewBox'].split(' ')
+        try:
+            return (parse_length(svg_attributes['width']), parse_length(svg_attributes['height']))
+        except ValueError:
+            pass
+    if 'viewBox' in svg_attributes:
+        values = svg_attributes['viewBox'].replace(',', ' ').split()
         return (float(values[2]), float(values[3]))
-    else:
-        return None
+    return None
+
+
+def get_scale(resolution, required_size=None, max_size=None) -> float:
+    """
+    Returns the scale which fits the image in required_size
+    (vector images may be scaled up) and then limits it to max_size.
+    """
+    scale = 1
+    if resolution is None:
+        return scale
+    width, height = resolution
+    if required_size is not None:
+        scale = min(required_size[0] / width, required_size[1] / height)
+    if max_size is not None:
+        scale = min(scale, max_size[0] / width, max_size[1] / height)
+    return scale
+
+
+def _image_bytes(img: PIL.Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+class SVGRenderer:
+    """
+    Renders SVG by librsvg in process, if its GObject bindings
+    are installed, or by rsvg-convert otherwise.
+
+    Recent rasters are cached by content hash, scale and base file,
+    so repeated requests of the same image are not rendered again.
+    The cache is limited by the size of the rasters in bytes.
+    """
+
+    def __init__(self, cache_size=RENDER_CACHE_SIZE):
+        self._cache: collections.OrderedDict[tuple, PIL.Image.Image] = \
+            collections.OrderedDict()
+        self._cache_size = cache_size
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_handle(data: bytes, base_file: pathlib.Path | None):
+        # relative references are resolved against the base file
+        stream = Gio.MemoryInputStream.new_from_bytes(GLib.Bytes.new(data))
+        base = Gio.File.new_for_path(str(base_file)) if base_file is not None else None
+        return Rsvg.Handle.new_from_stream_sync(stream, base, Rsvg.HandleFlags.FLAGS_NONE, None)
+
+    @staticmethod
+    def _handle_size(handle) -> tuple[float, float]:
+        has_size, width, height = handle.get_intrinsic_size_in_pixels()
+        if not has_size:
+            dimensions = handle.get_dimensions()
+            width, height = dimensions.width, dimensions.height
+        return width, height
+
+    def _render_in_process(
+            self, data: bytes, scale: float, base_file: pathlib.Path | None, fit_size
+    ) -> PIL.Image.Image:
+        handle = self._load_handle(data, base_file)
+        width, height = self._handle_size(handle)
+        if fit_size is not None:
+            scale = get_scale((width, height), fit_size)
+        size = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, *size)
+        context = cairo.Context(surface)
+        viewport = Rsvg.Rectangle()
+        viewport.x, viewport.y = 0, 0
+        viewport.width, viewport.height = size
+        handle.render_document(context, viewport)
+        surface.flush()
+        # cairo stores premultiplied native endian ARGB
+        return PIL.Image.frombuffer(
+            "RGBA", size, bytes(surface.get_data()), "raw", "BGRa", surface.get_stride(), 1
+        )
+
+    @staticmethod
+    def _render_subprocess(
+            data: bytes, scale: float, base_file: pathlib.Path | None, fit_size
+    ) -> PIL.Image.Image:
+        commandline = ['rsvg-convert', '--format=png']
+        if fit_size is not None:
+            commandline += ['-w', str(fit_size[0]), '-h', str(fit_size[1]), '--keep-aspect-ratio']
+        else:
+            commandline += ['-z', str(scale)]
+        if base_file is not None:
+            # file argument keeps relative references resolvable
+            result = subprocess.run(commandline + [str(base_file)], capture_output=True)
+        else:
+            result = subprocess.run(commandline, input=data, capture_output=True)
+        result.check_returncode()
+        img = PIL.Image.open(io.BytesIO(result.stdout))
+        img.load()
+        return img
+
+    def size(self, data: bytes, base_file: pathlib.Path | None = None) -> tuple[float, float] | None:
+        """
+        Returns the size computed by librsvg, or None without its bindings.
+        """
+        if Rsvg is None:
+            return None
+        return self._handle_size(self._load_handle(data, base_file))
+
+    def render(
+            self, data: bytes, scale: float = 1, base_file: pathlib.Path | None = None, fit_size=None
+    ) -> PIL.Image.Image:
+        """
+        Returns a new image, which may be modified by the caller.
+        If fit_size is given, scale is ignored and the image is fitted in it.
+        """
+        key = (hashlib.sha256(data).digest(), scale, base_file, fit_size)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key].copy()
+        if Rsvg is not None:
+            img = self._render_in_process(data, scale, base_file, fit_size)
+        else:
+            img = self._render_subprocess(data, scale, base_file, fit_size)
+        img_bytes = _image_bytes(img)
+        if img_bytes <= self._cache_size:
+            with self._lock:
+                if key not in self._cache:
+                    self._cache[key] = img
+                    self._cached_bytes += img_bytes
+                while self._cached_bytes > self._cache_size:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= _image_bytes(evicted)
+        return img.copy()
+
+
+_renderer: SVGRenderer | None = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer() -> SVGRenderer:
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = SVGRenderer()
+    return _renderer
 
 
-def decode(source, required_size=None):
+def decode(source, required_size=None, max_size=None):
+    """
+    The scale is computed from the SVG size before rendering,
+    so the image is rendered once. Relative references of SVG files
+    are resolved against the file location.
+    """
+    base_file = None
+    if isinstance(source, (str, pathlib.Path)):
+        base_file = pathlib.Path(source).resolve()
+    with InputSourceFacade(source, ".svg") as source_handler:
+        data = bytes(source_handler.get_bytes())
+    if data[:2] == GZIP_SIGNATURE:
+        data = gzip.decompress(data)
+    renderer = get_renderer()
     scale = 1
-    source_handler = InputSourceFacade(source, ".svg")
-    input_file = source_handler.get_file_str()
+    if required_size is not None or max_size is not None:
+        resolution = get_resolution(data)
+        if resolution is None:
+            resolution = renderer.size(data, base_file)
+        scale = get_scale(resolution, required_size, max_size)
     try:
-        if required_size is not None:
-            width, height = get_resolution(source_handler.get_bytes())
-            if (required_size[0] / width * height) <= required_size[1]:
-                scale = required_size[0] / width
-            else:
-                scale = required_size[1] / height
-    except ValueError:
-        pass
-    buffer = None
-    buffer = io.BytesIO(subprocess.run(
-        ['rsvg-convert', '--format=png', '-z', str(scale), input_file],
-        capture_output=True
-    ).stdout)
-    source_handler.close()
-    return PIL.Image.open(buffer)
+        return renderer.render(data, scale, base_file)
+    except PIL.Image.DecompressionBombError:
+        if max_size is None:
+            raise
+        # size is unknown before rendering, the raster is fitted in max_size
+        return renderer.render(data, base_file=base_file, fit_size=tuple(max_size))
@@ -1,4 +1,10 @@
+import io
+import subprocess
+
+import PIL.Image
+
 from . import ffmpeg_frames_stream
+from ..common import file_type
 
 
 def mp4_header_check(prefix):
@@ -13,47 +19,54 @@ def mkv_header_check(prefix):
 
 
 def mpd_check(file_path):
-    file = open(file_path, 'r')
-    try:
-        line = file.readline()
-        if "<?xml" in line:
-            if "<MPD" in line:
-                file.close()
-                return True
-            line = file.readline()
-            if "<MPD" in line:
-                file.close()
-                return True
-    except UnicodeDecodeError:
-        pass
-    file.close()
-    return False
+    return file_type.sniff(file_path) is file_type.FileType.MPD
 
 
 def is_regular_video(file_path):
-    file = open(file_path, 'rb')
-    header = file.read(16)
-    file.close()
-    return mkv_header_check(header) or mp4_header_check(header)
+    return file_type.sniff(file_path) in (file_type.FileType.MP4, file_type.FileType.MKV)
 
 
 def is_video(file_path):
-    regular = is_regular_video(file_path)
-    return regular or mpd_check(file_path)
+    return file_type.sniff(file_path) in file_type.VIDEO_TYPES
 
 
 def is_webm(file_path):
-    file = open(file_path, 'rb')
-    header = file.read(16)
-    file.close()
-    return mkv_header_check(header)
+    return file_type.sniff(file_path) is file_type.FileType.MKV
 
 
 def open_video(file_path):
-    if is_regular_video(file_path):
+    video_type = file_type.sniff(file_path)
+    if video_type in (file_type.FileType.MP4, file_type.FileType.MKV):
         return ffmpeg_frames_stream.FFmpegFramesStream(file_path)
-    elif mpd_check(file_path):
+    elif video_type is file_type.FileType.MPD:
         stream = ffmpeg_frames_stream.FFmpegFramesStream(file_path)
         return stream
     else:
         raise NotImplementedError()
+
+
+def poster_frame(file_path, at: float | None = None, size: tuple[int, int] | None = None) -> PIL.Image.Image:
+    """
+    Decodes a single frame: the keyframe at or before time "at" (in seconds)
+    or the first keyframe, scaled down to fit in size.
+
+    Input side seeking and keyframe only decoding skip the rest of the video,
+    so it costs about one frame decoding regardless of the video length.
+    """
+    commandline = ['ffmpeg', '-loglevel', 'error', '-skip_frame', 'nokey']
+    if at is not None and at > 0:
+        commandline += ['-noaccurate_seek', '-ss', str(at)]
+    commandline += ['-i', str(file_path), '-map', '0:V:0']
+    if size is not None:
+        commandline += [
+            '-vf',
+            "scale='min(iw,{0})':'min(ih,{1})':force_original_aspect_ratio=decrease".format(*size)
+        ]
+    commandline += ['-frames:v', '1', '-f', 'image2pipe', '-vcodec', 'ppm', '-']
+    result = subprocess.run(commandline, capture_output=True)
+    result.check_returncode()
+    if not result.stdout:
+        raise EOFError("no keyframe at {}".format(at))
+    image = PIL.Image.open(io.BytesIO(result.stdout))
+    image.load()
+    return image
@@ -1,6 +1,11 @@
+import io
 import subprocess
 import re
 
+import PIL.Image
+
+from .size import decode_scale
+
 info_chunk_pattern = re.compile(r"Chunk \w{1,4}")
 
 info_duration_pattern = re.compile(r"\s{2}Duration: \d+\s*")
@@ -19,3 +24,27 @@ def get_frames_duration(file_name):
         elif current_chunk == 'ANMF' and info_duration_pattern.search(line):
             duration.append(int(re.findall("\d+", line)[0]))
     return duration
+
+
+def decode(file_name, required_size=None) -> PIL.Image.Image:
+    """
+    Still images are scaled down by libwebp while decoding (dwebp -scale),
+    which is cheaper than decoding at full size.
+    """
+    img = PIL.Image.open(file_name)
+    scale = decode_scale(img.size, required_size)
+    if scale == 1 or getattr(img, "is_animated", False):
+        return img
+    width = max(int(round(img.width * scale)), 1)
+    height = max(int(round(img.height * scale)), 1)
+    try:
+        result = subprocess.run(
+            ['dwebp', '-scale', str(width), str(height), '-pam', '-o', '-', str(file_name)],
+            capture_output=True
+        )
+    except FileNotFoundError:
+        return img
+    if result.returncode != 0:
+        return img
+    img.close()
+    return PIL.Image.open(io.BytesIO(result.stdout))
@@ -1,19 +1,29 @@
 import logging
 from . import exif_reader, iptc_reader, png_reader
+from ..common import jpeg_header
 
 logger = logging.getLogger(__name__)
 
-supported_formats = {"png", "jpg", "jpeg", "jfif", "webp"}
+supported_formats = {"png", "jpg", "jpeg", "jfif", "webp", "avif"}
 
 
 def get_metadata_from_source(source, _format) -> dict[str, str]:
     if _format == "png":
         return png_reader.read(source)
-    elif _format in {"jpg", "jpeg", "jfif", "webp"}:
-        metadata = exif_reader.read(source)
-        if _format in {"jpg", "jpeg", "jfif"}:
+    elif _format in {"jpg", "jpeg", "jfif"}:
+        try:
+            header = jpeg_header.read_header(source)
+        except ValueError:
+            header = None
+        metadata = dict()
+        # readers are skipped if the file has no segments for them
+        if header is None or header.exif is not None:
+            metadata.update(exif_reader.read(source))
+        if header is None or header.app13 is not None:
             metadata.update(iptc_reader.read(source))
         return metadata
+    elif _format in {"webp", "avif"}:
+        return exif_reader.read(source)
     else:
         logger.warning(f"Not found reader for format: {_format}")
         return {}
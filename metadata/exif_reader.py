@@ -1,6 +1,7 @@
 import io
 import logging
 from PIL import Image, ExifTags
+from . import exif_segment
 from ..common.utils import (
     check_is_fractions,
     to_fractions_or_float,
@@ -498,16 +499,7 @@ def comfyui_prompt_extractor(
     return result_data
 
 
-def read(jpeg_source) -> dict[str, str]:
-    if isinstance(jpeg_source, (bytes, bytearray)):
-        file_interface = io.BytesIO(jpeg_source)
-        img = Image.open(file_interface)
-    else:
-        img = Image.open(jpeg_source)
-    exif = img.getexif()
-    if exif is None:
-        return {}
-
+def format_exif(exif: Image.Exif) -> dict[str, str]:
     decoded_exif_data: dict[str, str] = read_tags(exif.items)
 
     decoded_exif_data.update(read_exif_offset(exif))
@@ -518,8 +510,6 @@ def read(jpeg_source) -> dict[str, str]:
     if test_comfyui_metadata(decoded_exif_data):
         decoded_exif_data.update(comfyui_prompt_extractor(decoded_exif_data))
 
-    img.close()
-
     filtered_exif_data = {}
     for key in decoded_exif_data:
         if decoded_exif_data[key] == "":
@@ -527,3 +517,40 @@ def read(jpeg_source) -> dict[str, str]:
         filtered_exif_data[key] = decoded_exif_data[key]
 
     return filtered_exif_data
+
+
+def read_exif_data(exif_data: bytes) -> dict[str, str]:
+    """
+    Reads raw EXIF data (TIFF structure, optionally with Exif header).
+    """
+    exif = Image.Exif()
+    exif.load(bytes(exif_data))
+    return format_exif(exif)
+
+
+def _read_from_image(source) -> dict[str, str]:
+    if isinstance(source, (bytes, bytearray)):
+        file_interface = io.BytesIO(source)
+        img = Image.open(file_interface)
+    else:
+        img = Image.open(source)
+    exif = img.getexif()
+    if exif is None:
+        return {}
+    decoded_exif_data = format_exif(exif)
+    img.close()
+    return decoded_exif_data
+
+
+def read(jpeg_source) -> dict[str, str]:
+    """
+    Reads EXIF of JPEG, PNG, WebP and AVIF/HEIF from its segment only.
+    Other formats are opened by Pillow.
+    """
+    try:
+        exif_data = exif_segment.find_exif(jpeg_source)
+    except ValueError:
+        return _read_from_image(jpeg_source)
+    if exif_data is None:
+        return {}
+    return read_exif_data(exif_data)
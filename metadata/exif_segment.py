@@ -0,0 +1,222 @@
+import contextlib
+import mmap
+import struct
+import zlib
+
+from ..common import file_type, jpeg_header
+from ..common.file_type import FileType
+from ..common.init_segment import iter_boxes
+
+RAW_PROFILE_KEYWORD = b"Raw profile type exif"
+PNG_TEXT_CHUNKS = {b"tEXt", b"zTXt", b"iTXt"}
+
+
+@contextlib.contextmanager
+def _open_data(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield memoryview(source)
+    else:
+        with open(source, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+
+def decode_raw_profile(text) -> bytes:
+    """
+    Decodes ImageMagick raw profile:
+    profile name, data length and hex encoded data on separate lines.
+    """
+    if isinstance(text, (bytes, bytearray)):
+        text = text.decode("latin-1")
+    lines = text.strip().split("\n")
+    if len(lines) < 3:
+        raise ValueError("broken raw profile")
+    length = int(lines[1])
+    return bytes.fromhex("".join(lines[2:]))[:length]
+
+
+def _png_raw_profile(chunk_type: bytes, payload) -> bytes | None:
+    keyword, separator, text = bytes(payload).partition(b"\x00")
+    if keyword != RAW_PROFILE_KEYWORD or not separator:
+        return None
+    if chunk_type == b"zTXt":
+        text = zlib.decompress(text[1:])
+    elif chunk_type == b"iTXt":
+        compression_flag = text[0]
+        # language tag and translated keyword
+        text = text[2:].split(b"\x00", maxsplit=2)[-1]
+        if compression_flag:
+            text = zlib.decompress(text)
+    return decode_raw_profile(text)
+
+
+def _find_png_exif(data) -> bytes | None:
+    offset = 8
+    while offset + 8 <= len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, offset)
+        payload = data[offset + 8:offset + 8 + length]
+        if chunk_type == b"eXIf":
+            return bytes(payload)
+        elif chunk_type in PNG_TEXT_CHUNKS:
+            exif_data = _png_raw_profile(chunk_type, payload)
+            if exif_data is not None:
+                return exif_data
+        elif chunk_type == b"IEND":
+            break
+        # length, type, data and CRC, IDAT is skipped without reading
+        offset += length + 12
+    return None
+
+
+def _find_webp_exif(data) -> bytes | None:
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_type, size = struct.unpack_from("<4sI", data, offset)
+        if chunk_type == b"EXIF":
+            return bytes(data[offset + 8:offset + 8 + size])
+        offset += 8 + size + (size & 1)
+    return None
+
+
+def _read_uint(data, offset: int, size: int) -> int:
+    if size == 0:
+        return 0
+    return int.from_bytes(data[offset:offset + size], "big")
+
+
+def _exif_item_id(data, offset, end) -> int | None:
+    version = data[offset]
+    if version == 0:
+        offset += 6
+    else:
+        offset += 8
+    for box_type, payload, box_end in iter_boxes(data, offset, end):
+        if box_type != b"infe":
+            continue
+        version = data[payload]
+        if version < 2:
+            continue
+        id_size = 2 if version == 2 else 4
+        item_id = _read_uint(data, payload + 4, id_size)
+        item_type = bytes(data[payload + 4 + id_size + 2:payload + 4 + id_size + 6])
+        if item_type == b"Exif":
+            return item_id
+    return None
+
+
+def _item_extents(data, offset, item_id: int) -> tuple[int, list[tuple[int, int]]] | None:
+    """
+    Returns construction method and (offset, length) extents of the item.
+    """
+    version = data[offset]
+    offset += 4
+    offset_size = data[offset] >> 4
+    length_size = data[offset] & 0x0f
+    base_offset_size = data[offset + 1] >> 4
+    index_size = data[offset + 1] & 0x0f if version in (1, 2) else 0
+    offset += 2
+    id_size = 2 if version < 2 else 4
+    item_count = _read_uint(data, offset, id_size)
+    offset += id_size
+    for item in range(item_count):
+        current_id = _read_uint(data, offset, id_size)
+        offset += id_size
+        construction_method = 0
+        if version in (1, 2):
+            construction_method = _read_uint(data, offset, 2) & 0x0f
+            offset += 2
+        # data reference index
+        offset += 2
+        base_offset = _read_uint(data, offset, base_offset_size)
+        offset += base_offset_size
+        extent_count = _read_uint(data, offset, 2)
+        offset += 2
+        extents = []
+        for extent in range(extent_count):
+            offset += index_size
+            extent_offset = _read_uint(data, offset, offset_size)
+            offset += offset_size
+            extent_length = _read_uint(data, offset, length_size)
+            offset += length_size
+            extents.append((base_offset + extent_offset, extent_length))
+        if current_id == item_id:
+            return construction_method, extents
+    return None
+
+
+def _find_isobmff_exif(data) -> bytes | None:
+    for box_type, payload, box_end in iter_boxes(data):
+        if box_type != b"meta":
+            continue
+        # full box header
+        children = {
+            child_type: (child_payload, child_end)
+            for child_type, child_payload, child_end in iter_boxes(data, payload + 4, box_end)
+        }
+        if b"iinf" not in children or b"iloc" not in children:
+            return None
+        item_id = _exif_item_id(data, *children[b"iinf"])
+        if item_id is None:
+            return None
+        item = _item_extents(data, children[b"iloc"][0], item_id)
+        if item is None:
+            return None
+        construction_method, extents = item
+        base = 0
+        if construction_method == 1:
+            if b"idat" not in children:
+                return None
+            base = children[b"idat"][0]
+        elif construction_method != 0:
+            return None
+        item_data = b"".join(
+            bytes(data[base + extent_offset:base + extent_offset + extent_length])
+            for extent_offset, extent_length in extents
+        )
+        # item starts with offset to TIFF header
+        tiff_header_offset = struct.unpack_from(">I", item_data)[0]
+        return item_data[4 + tiff_header_offset:]
+    return None
+
+
+def _find_jpeg_exif(source) -> bytes | None:
+    header = jpeg_header.read_header(source)
+    if header.exif is None:
+        return None
+    offset, length = header.exif
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[offset:offset + length])
+    with open(source, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+LOCATORS = {
+    FileType.PNG: _find_png_exif,
+    FileType.WEBP: _find_webp_exif,
+    FileType.AVIF: _find_isobmff_exif,
+    FileType.AVIF_SEQUENCE: _find_isobmff_exif,
+}
+
+
+def find_exif(source) -> bytes | None:
+    """
+    Returns EXIF data of a file path or bytes-like object,
+    located by container headers without reading pixel data.
+    Returns None if the file has no EXIF data,
+    raises ValueError if the format is not supported.
+    """
+    with _open_data(source) as data:
+        prefix = bytes(data[:file_type.SNIFF_SIZE])
+        source_type = file_type.sniff(prefix)
+        try:
+            if source_type is FileType.JPEG:
+                return _find_jpeg_exif(source)
+            elif source_type in LOCATORS:
+                return LOCATORS[source_type](data)
+            elif prefix[4:8] == b"ftyp":
+                # HEIF and other ISO-BMFF images
+                return _find_isobmff_exif(data)
+        except (struct.error, IndexError, zlib.error) as e:
+            raise ValueError("truncated or broken header") from e
+    raise ValueError("format is not supported", source_type)
@@ -2,7 +2,7 @@ import pathlib
 import png
 import abc
 import zlib
-from . import exif_reader, iptc_reader
+from . import exif_reader, exif_segment, iptc_reader
 
 
 class EmptyContentError(ValueError):
@@ -42,7 +42,7 @@ class BaseTextReading(AbstractTextReading):
             raise EmptyContentError("Empty content")
         keyword = raw_keyword.decode("latin-1")
         if keyword == EXIF_KEYWORD:
-            raise EXIF_Data()
+            raise EXIF_Data(self.decode_content(raw_data))
         elif keyword == IPTC_KEYWORD:
             return self.decode_iptc(raw_data)
         elif keyword == ICC_KEYWORD:
@@ -100,26 +100,29 @@ class iTXt_Reading(AbstractTextReading):
         super().__init__("utf-8")
 
     def read(self, chunk_content):
-        raw_keyword, packed_data, translated_keyword, text_data = bytes(
-            chunk_content
-        ).split(b"\x00", maxsplit=3)
+        # compression flag and method are single bytes, which may be zero,
+        # so only the keyword and the null terminated fields are split
+        raw_keyword, _, fields = bytes(chunk_content).partition(b"\x00")
         keyword = raw_keyword.decode("latin-1")
+        text_fields = fields[2:].split(b"\x00", maxsplit=2)
+        if len(fields) < 2 or len(text_fields) < 3:
+            raise EmptyContentError()
+        compression_flag = fields[0]
+        compression_method = fields[1]
+        language_tag, translated_keyword, text_data = text_fields
 
-        if keyword == "XML:com.adobe.xmp":
-            keyword = "XML::XMP"
-            text = text_data.replace(b"\x00", b"", 2).decode(self.charset)
-            return keyword, text
-        elif keyword == EXIF_KEYWORD:
-            raise EXIF_Data()
+        if keyword == EXIF_KEYWORD:
+            if compression_flag:
+                raise EXIF_Data(decode_ztxt(compression_method, text_data))
+            raise EXIF_Data(text_data)
         elif keyword == ICC_KEYWORD:
             raise EmptyContentError("ICC profile found")
 
-        if not len(packed_data):
-            raise EmptyContentError()
-
-        compression_flag = packed_data[0]
-        compression_method = packed_data[1]
-        language_tag = packed_data[2:]
+        if keyword == "XML:com.adobe.xmp":
+            keyword = "XML::XMP"
+            if compression_flag:
+                text_data = decode_ztxt(compression_method, text_data)
+            return keyword, text_data.decode(self.charset)
 
         if language_tag:
             keyword += f" ({language_tag.decode('ascii')})"
@@ -165,8 +168,12 @@ def read(png_source):
                     continue
             except EmptyContentError:
                 continue
-            except EXIF_Data:
-                metadata.update(exif_reader.read(png_source))
+            except EXIF_Data as e:
+                metadata.update(exif_reader.read_exif_data(
+                    exif_segment.decode_raw_profile(e.args[0])
+                ))
                 continue
             metadata[keyword] = text_content
+        elif chunk_name == b"eXIf":
+            metadata.update(exif_reader.read_exif_data(chunk_content))
     return metadata
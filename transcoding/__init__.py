@@ -63,21 +63,16 @@ def get_file_transcoder(
             return v_writer
 
 
-PNG_HEADER = b'\x89PNG'
-JPEG_HEADER = b'\xff\xd8'
-GIF_HEADERS = {b'GIF87a', b'GIF89a'}
-
-
 def isPNG(data: bytearray) -> bool:
-    return data[:4] == PNG_HEADER
+    return file_type.sniff(data) is file_type.FileType.PNG
 
 
 def isJPEG(data: bytearray) -> bool:
-    return data[:2] == JPEG_HEADER
+    return file_type.sniff(data) is file_type.FileType.JPEG
 
 
 def isGIF(data: bytearray) -> bool:
-    return bytes(data[:6]) in GIF_HEADERS
+    return file_type.sniff(data) is file_type.FileType.GIF
 
 
 def get_memory_transcoder(
@@ -87,8 +82,8 @@ def get_memory_transcoder(
         force_lossless=False,
         rewrite=False,
 ):
-    from ..decoders.video import MKV_HEADER
-    if isPNG(source):
+    source_type = file_type.sniff(source)
+    if source_type is file_type.FileType.PNG:
         png_transcoder = png_source_transcode.PNGInMemoryTranscode(
             source, path, filename, rewrite, force_lossless
         )
@@ -96,12 +91,12 @@ def get_memory_transcoder(
         png_transcoder.lossless_encoder_type = config.png_source_encoders["lossless_encoder"]
         png_transcoder.lossy_encoder_type = config.png_source_encoders["lossy_encoder"]
         return png_transcoder
-    elif isJPEG(source):
+    elif source_type is file_type.FileType.JPEG:
         jpeg_transcoder = jpeg_source_transcode.JPEGInMemoryTranscode(source, path, filename)
         jpeg_transcoder.lossy_encoder_type = config.jpeg_source_encoders["lossy_encoder"]
         jpeg_transcoder.lossless_jpeg_transcoder_type = config.jpeg_source_encoders["lossless_transcoder"]
         return jpeg_transcoder
-    elif isGIF(source):
+    elif source_type is file_type.FileType.GIF:
         gif_transcoder = gif_source_transcode.GIFInMemoryTranscode(source, path, filename, rewrite)
         gif_transcoder.lossy_encoder_type = config.gif_source_encoders["lossy_encoder"]
         gif_transcoder.animation_encoder_type = config.gif_source_encoders["animation_encoder"]
@@ -121,7 +116,7 @@ def get_memory_transcoder(
         else:
             svg_writer = svg_source_encoder.SVGWriter(source, path, filename)
             return svg_writer
-    elif bytes(source[:4]) in MKV_HEADER:
+    elif source_type is file_type.FileType.MKV:
         src_metadata = common.ffmpeg.probe(source)
         if common.ffmpeg.parser.test_videoloop(src_metadata):
             if common.ffmpeg.parser.test_video_cl3(src_metadata):
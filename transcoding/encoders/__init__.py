@@ -7,6 +7,7 @@ from . import (
     dash_encoder,
     srs_image_encoder,
     srs_video_encoder,
+    storyboard,
     jpeg_xl_encoder,
     jpeg_recompression,
 )
@@ -2,12 +2,11 @@ import io
 import logging
 import pathlib
 import subprocess
-import tempfile
 
 import PIL.Image
 
 from ... import config
-from ...common import run_subprocess
+from ...common import run_subprocess, scratch
 from .encoder import BytesEncoder
 
 MAX_AVIF_YUV444_SIZE = 2**26 + 2**25
@@ -63,56 +62,48 @@ class AVIFEncoder(BytesEncoder):
             if self.enable_tune_ssimulacra2:
                 commandline += ['-a', 'color:tune=iq']
 
-        output_tmp_file = tempfile.NamedTemporaryFile(
-            mode='rb', suffix=".avif", delete=True)
+        # uncompressed source copy and encoded output
+        with scratch.job(self._img.width * self._img.height * 8) as scratch_job:
+            output_tmp_file = scratch_job.file(".avif")
 
-        src_tmp_file = None
-
-        if check_source_acceptable(self, reencode_source):
-            commandline += [
-                self._source,
-                output_tmp_file.name
-            ]
-        else:
-            src_tmp_file_name = None
-            is_source_byteslike = isinstance(self._source, (memoryview, bytes))
-            if not reencode_source and self._img.format == "PNG" and is_source_byteslike:
-                src_tmp_file = tempfile.NamedTemporaryFile(
-                    mode='wb', suffix=".png", delete=True)
-                src_tmp_file.write(self._source)
-            elif not reencode_source and self._img.format == "JPEG" and is_source_byteslike:
-                src_tmp_file = tempfile.NamedTemporaryFile(
-                    mode='wb', suffix=".jpg", delete=True)
-                src_tmp_file.write(self._source)
+            if check_source_acceptable(self, reencode_source):
+                commandline += [
+                    self._source,
+                    output_tmp_file
+                ]
             else:
-                src_tmp_file = tempfile.NamedTemporaryFile(
-                    mode='wb', suffix=".png", delete=True)
-                self._img.save(src_tmp_file, format="PNG", compress_level=0)
-            src_tmp_file_name = src_tmp_file.name
-
-            if ".png" in src_tmp_file_name:
-                # fix ICPP profiles error
-                check_error = subprocess.run(
-                    ['pngcrush', '-n', '-q', src_tmp_file_name], stderr=subprocess.PIPE)
-                if b'pngcrush: iCCP: Not recognizing known sRGB profile that has been edited' in check_error.stderr:
-                    buf = io.BytesIO()
-                    self._img.save(buf, format="PNG")
-                    proc = subprocess.Popen(
-                        ['magick', '-', src_tmp_file_name], stdin=subprocess.PIPE)
-                    proc.communicate(buf.getbuffer())
-                    proc.wait()
-
-            commandline += [
-                src_tmp_file_name,
-                output_tmp_file.name
-            ]
-        logger.debug("commandline {}".format(commandline.__repr__()))
-
-        run_subprocess(commandline, log_stdout=True)
-        if src_tmp_file is not None:
-            src_tmp_file.close()
-        encoded_data = output_tmp_file.read()
-        output_tmp_file.close()
+                is_source_byteslike = isinstance(self._source, (memoryview, bytes))
+                if not reencode_source and self._img.format == "PNG" and is_source_byteslike:
+                    src_tmp_file = scratch_job.file(".png")
+                    src_tmp_file.write_bytes(self._source)
+                elif not reencode_source and self._img.format == "JPEG" and is_source_byteslike:
+                    src_tmp_file = scratch_job.file(".jpg")
+                    src_tmp_file.write_bytes(self._source)
+                else:
+                    src_tmp_file = scratch_job.file(".png")
+                    self._img.save(src_tmp_file, format="PNG", compress_level=0)
+                src_tmp_file_name = str(src_tmp_file)
+
+                if ".png" in src_tmp_file_name:
+                    # fix ICPP profiles error
+                    check_error = subprocess.run(
+                        ['pngcrush', '-n', '-q', src_tmp_file_name], stderr=subprocess.PIPE)
+                    if b'pngcrush: iCCP: Not recognizing known sRGB profile that has been edited' in check_error.stderr:
+                        buf = io.BytesIO()
+                        self._img.save(buf, format="PNG")
+                        proc = subprocess.Popen(
+                            ['magick', '-', src_tmp_file_name], stdin=subprocess.PIPE)
+                        proc.communicate(buf.getbuffer())
+                        proc.wait()
+
+                commandline += [
+                    src_tmp_file_name,
+                    output_tmp_file
+                ]
+            logger.debug("commandline {}".format(commandline.__repr__()))
+
+            run_subprocess(commandline, log_stdout=True)
+            encoded_data = output_tmp_file.read_bytes() if output_tmp_file.exists() else b""
         if len(encoded_data) == 0 and not reencode_source:
             logger.warning("Encoded file is empty. Try again with resaved source file.")
             # This code temporary disabled.
@@ -0,0 +1,265 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import math
+import os
+import pathlib
+import shutil
+
+from ... import common, config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class VideoRepresentation:
+    """
+    Video stream of a DASH manifest.
+
+    Codec options are stored without stream specifiers, so the same
+    representation can be rendered into a single ffmpeg invocation
+    or encoded segment by segment.
+    If filters is None, the first source video stream is used as is.
+    """
+    options: dict[str, str]
+    filters: str | None = None
+
+    @property
+    def is_copy(self) -> bool:
+        return self.options.get("c") == "copy"
+
+    def commandline(self, stream_specifier: str) -> list[str]:
+        commandline = []
+        for option, value in self.options.items():
+            commandline += [f"-{option}:{stream_specifier}", str(value)]
+        return commandline
+
+
+class SegmentJournal:
+    """
+    Append-only journal of completed segments.
+
+    Each line is a JSON object. The first line holds the fingerprint
+    of the encoding parameters; a journal with another fingerprint
+    belongs to a different encode and is discarded.
+    """
+
+    def __init__(self, journal_file: pathlib.Path, fingerprint: str):
+        self.journal_file = journal_file
+        self.fingerprint = fingerprint
+        self._entries: dict[tuple[int, int], dict] = dict()
+        self.is_resumed = False
+        if self.journal_file.is_file():
+            self._load()
+
+    def _load(self):
+        with self.journal_file.open("r") as f:
+            lines = f.readlines()
+        if not lines:
+            return
+        try:
+            header = json.loads(lines[0])
+        except json.JSONDecodeError:
+            return
+        if header.get("fingerprint") != self.fingerprint:
+            logger.info("encoding parameters changed, journal discarded")
+            return
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # last line may be torn by interruption
+                continue
+            self._entries[(entry["representation"], entry["segment"])] = entry
+        self.is_resumed = True
+
+    def start(self):
+        if self.is_resumed:
+            return
+        with self.journal_file.open("w") as f:
+            f.write(json.dumps({"fingerprint": self.fingerprint}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_complete(
+        self, representation: int, segment: int, file: pathlib.Path
+    ) -> bool:
+        entry = self._entries.get((representation, segment))
+        return (
+            entry is not None and
+            entry["file"] == file.name and
+            file.is_file() and
+            file.stat().st_size == entry["size"]
+        )
+
+    def record(self, representation: int, segment: int, file: pathlib.Path):
+        entry = {
+            "representation": representation,
+            "segment": segment,
+            "file": file.name,
+            "size": file.stat().st_size,
+        }
+        with self.journal_file.open("a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._entries[(representation, segment)] = entry
+
+    def remove(self):
+        self.journal_file.unlink(missing_ok=True)
+
+
+class CheckpointedEncode:
+    """
+    Encodes video representations in GOP-aligned segments.
+
+    Completed segments are recorded in a journal next to the manifest,
+    so an interrupted encode resumes from the first missing segment.
+    When every segment is done, the segments are joined
+    and muxed into the DASH manifest without re-encoding.
+    """
+
+    def __init__(
+        self,
+        input_file: pathlib.Path,
+        mpd_file: pathlib.Path,
+        representations: list[VideoRepresentation],
+        duration: float,
+        segment_duration: float,
+    ):
+        self.input_file = input_file
+        self.mpd_file = mpd_file
+        self.representations = representations
+        self.duration = duration
+        self.segment_duration = segment_duration
+        self.parts_dir = mpd_file.with_name(f"{mpd_file.name}.parts")
+        self.journal = SegmentJournal(
+            mpd_file.with_name(f"{mpd_file.name}.journal"),
+            self.fingerprint()
+        )
+
+    def fingerprint(self) -> str:
+        stat_result = pathlib.Path(self.input_file).stat()
+        fingerprint = hashlib.blake2b(digest_size=16)
+        fingerprint.update(repr((
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+            [dataclasses.astuple(r) for r in self.representations],
+            self.segment_duration,
+        )).encode())
+        return fingerprint.hexdigest()
+
+    def segments(self) -> list[float]:
+        segments_count = max(1, math.ceil(self.duration / self.segment_duration))
+        return [i * self.segment_duration for i in range(segments_count)]
+
+    def segment_file(self, representation: int, segment: int) -> pathlib.Path:
+        return self.parts_dir.joinpath(f"v{representation}-{segment:05d}.mkv")
+
+    def encode_segment(
+        self,
+        representation_index: int,
+        representation: VideoRepresentation,
+        segment: int,
+        start: float,
+        is_last: bool
+    ):
+        segment_file = self.segment_file(representation_index, segment)
+        tmp_segment_file = segment_file.with_suffix(".partial")
+        commandline = [
+            "ffmpeg", "-y",
+            "-ss", str(start),
+            "-i", str(self.input_file),
+            "-map", "0:v:0",
+        ]
+        if representation.filters is not None:
+            commandline += ["-vf", representation.filters]
+        commandline += representation.commandline("v:0")
+        commandline += ['-threads', str(config.dash_encoding_threads)]
+        if not is_last:
+            # both ends are cut by time, so segment boundaries meet
+            # exactly at fractional or variable frame rates
+            commandline += ["-t", str(self.segment_duration)]
+        commandline += ["-an", "-f", "matroska", str(tmp_segment_file)]
+        logger.debug("segment commandline: {}".format(commandline))
+        result = common.run_subprocess(commandline)
+        if result.returncode != 0:
+            tmp_segment_file.unlink(missing_ok=True)
+            result.check_returncode()
+        tmp_segment_file.replace(segment_file)
+        self.journal.record(representation_index, segment, segment_file)
+
+    def encode_representation(
+        self, representation_index: int, representation: VideoRepresentation
+    ) -> pathlib.Path:
+        segments = self.segments()
+        for segment, start in enumerate(segments):
+            segment_file = self.segment_file(representation_index, segment)
+            if self.journal.is_complete(
+                representation_index, segment, segment_file
+            ):
+                logger.debug("segment {} is done, skipped".format(segment_file))
+                continue
+            self.encode_segment(
+                representation_index,
+                representation,
+                segment,
+                start,
+                segment == len(segments) - 1
+            )
+        concat_list_file = self.parts_dir.joinpath(
+            f"v{representation_index}.ffconcat"
+        )
+        with concat_list_file.open("w") as f:
+            f.write("ffconcat version 1.0\n")
+            for segment in range(len(segments)):
+                segment_file = self.segment_file(representation_index, segment)
+                f.write(f"file '{segment_file.name}'\n")
+        return concat_list_file
+
+    def run(self, output_commandline: list[str]) -> pathlib.Path:
+        """
+        Encodes missing segments and writes the DASH manifest.
+
+        output_commandline holds audio and muxer options
+        of the final ffmpeg invocation.
+        """
+        if not self.journal.is_resumed and self.parts_dir.exists():
+            shutil.rmtree(self.parts_dir)
+        self.parts_dir.mkdir(exist_ok=True)
+        self.journal.start()
+
+        commandline = ["ffmpeg", "-y"]
+        video_inputs = []
+        input_index = 0
+        for representation_index, representation in enumerate(
+            self.representations
+        ):
+            if representation.is_copy:
+                video_inputs.append(None)
+                continue
+            concat_list_file = self.encode_representation(
+                representation_index, representation
+            )
+            commandline += [
+                "-f", "concat", "-safe", "0", "-i", str(concat_list_file)
+            ]
+            video_inputs.append(input_index)
+            input_index += 1
+        source_index = input_index
+        commandline += ["-i", str(self.input_file)]
+        for video_input in video_inputs:
+            if video_input is None:
+                commandline += ["-map", f"{source_index}:v:0"]
+            else:
+                commandline += ["-map", f"{video_input}:v:0"]
+        commandline += ["-map", f"{source_index}:a?", "-c:v", "copy"]
+        commandline += output_commandline
+        commandline += [self.mpd_file]
+        logger.debug("assembly commandline: {}".format(commandline))
+        common.run_subprocess(commandline).check_returncode()
+
+        shutil.rmtree(self.parts_dir)
+        self.journal.remove()
+        return self.mpd_file
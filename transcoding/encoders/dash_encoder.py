@@ -1,24 +1,15 @@
-import io
 import json
 import logging
 import pathlib
-import random
 import shlex
-import string
 import subprocess
-import re
-import tempfile
-from typing import Iterable, Final
 
+from .dash_checkpoint import CheckpointedEncode, VideoRepresentation
 from .encoder import FilesEncoder
 from ... import common
-from ...common import ffmpeg
+from ...common import ffmpeg, scratch
 from ... import config
 
-import xml.dom.minidom
-
-file_template_regex = re.compile("\$[\da-zA-Z\-%]+\$")
-
 logger = logging.getLogger(__name__)
 
 
@@ -27,10 +18,13 @@ class DASHEncoder(FilesEncoder):
         self._crf = crf
         self._target_pixel_format = pix_fmt
         self._gop_size = gop_size
-        self.mpd_manifest_file: pathlib.Path | None = None
+        self.set_manifest_file(None)
+        self.checkpointing = config.dash_checkpointing
 
-    def set_manifest_file(self, manifest_file: pathlib.Path):
+    def set_manifest_file(self, manifest_file: pathlib.Path | None):
         self.mpd_manifest_file = manifest_file
+        self._files: list[pathlib.Path] | None = None
+        self._files_size: int | None = None
 
     @staticmethod
     def get_rounded_size(width_small, height_small, scale_coef, aspect_ratio):
@@ -94,28 +88,112 @@ class DASHEncoder(FilesEncoder):
         if self.mpd_manifest_file is None:
             return []
 
-        list_files = []
-
-        file_templates = set()
-        parent_dir = self.mpd_manifest_file.parent
-        try:
-            mpd_document: xml.dom.minidom.Document = xml.dom.minidom.parse(str(self.mpd_manifest_file))
-        except xml.parsers.expat.ExpatError:
-            return []
-        segment_templates: Iterable[xml.dom.minidom.Element] = mpd_document.getElementsByTagName("SegmentTemplate")
-        for template in segment_templates:
-            file_templates.add(file_template_regex.sub("*", template.getAttribute("initialization")))
-            file_templates.add(file_template_regex.sub("*", template.getAttribute("media")))
-        logger.debug(file_templates.__repr__())
+        if self._files is None:
+            try:
+                list_files = common.mpd.segment_files(self.mpd_manifest_file)
+            except (common.mpd.ParseError, FileNotFoundError):
+                return []
+            logger.debug(list_files.__repr__())
+            list_files.append(self.mpd_manifest_file)
+            self._files = list_files
+        return list(self._files)
+
+    def calc_file_size(self) -> int:
+        if self._files_size is None:
+            self._files_size = super().calc_file_size()
+        return self._files_size
+
+    def register_output(self, manifest_file: pathlib.Path):
+        """
+        Sets the written manifest and accumulates output files size,
+        so size comparisons don't touch the file system again.
+        """
+        self.set_manifest_file(manifest_file)
+        self.calc_file_size()
+
+    def encode_representations(
+        self,
+        input_file: pathlib.Path,
+        output_file: pathlib.Path,
+        representations: list[VideoRepresentation],
+        fps,
+        extra_output_options: list[str] = None,
+        fixed_segment_duration=True
+    ) -> pathlib.Path:
+        output_commandline = [
+            "-c:a", "copy",
+            "-dash_segment_type", "auto",
+        ]
+        if fixed_segment_duration:
+            output_commandline += ["-seg_duration", str(self._gop_size)]
+        output_commandline += [
+            "-media_seg_name", '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
+            "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
+        ]
+        if extra_output_options is not None:
+            output_commandline += extra_output_options
+        output_commandline += ["-f", "dash"]
+        output_file = output_file.with_suffix(".mpd")
 
-        file_templates_iterable: tuple[str] = tuple(file_templates)
-        for file_template in file_templates_iterable:
-            for file in parent_dir.glob(file_template):
-                if file.is_file():
-                    list_files.append(file)
+        if self.checkpointing and not all(r.is_copy for r in representations):
+            duration = ffmpeg.parser.get_duration(ffmpeg.probe(input_file))
+            checkpointed_encode = CheckpointedEncode(
+                input_file,
+                output_file,
+                representations,
+                duration,
+                self._gop_size * config.dash_checkpoint_segment_gops
+            )
+            checkpointed_encode.run(output_commandline)
+        else:
+            commandline = [
+                "ffmpeg",
+                "-i", input_file,
+            ]
+            filter_chains = []
+            maps = []
+            for i, representation in enumerate(representations):
+                if representation.filters is None:
+                    maps += ["-map", "0:v:0"]
+                else:
+                    filter_chains.append(f"[0]{representation.filters}[v{i}]")
+                    maps += ["-map", f"[v{i}]"]
+            if len(filter_chains):
+                commandline += ["-filter_complex", ";".join(filter_chains)]
+            commandline += maps
+            commandline += ["-map", "0:a?"]
+            for i, representation in enumerate(representations):
+                commandline += representation.commandline(f"v:{i}")
+            commandline += ['-threads', str(config.dash_encoding_threads)]
+            commandline += output_commandline
+            commandline += [
+                output_file
+            ]
+            logger.debug("commandline: {}".format(commandline))
+            if config.show_output_in_console:
+                subprocess.run(commandline)
+            else:
+                common.run_subprocess(commandline)
+        self.fix_codec_strings(output_file)
+        self.register_output(output_file)
+        return output_file
 
-        list_files.append(self.mpd_manifest_file)
-        return list_files
+    @staticmethod
+    def fix_codec_strings(mpd_file: pathlib.Path):
+        """
+        Writes exact RFC 6381 codec strings, read from init segments,
+        into Representation elements of the manifest.
+        """
+        codecs = dict()
+        for representation_id, init_segment in common.mpd.init_segments(mpd_file).items():
+            if not init_segment.is_file():
+                continue
+            codec_string = common.init_segment.codec_string(init_segment)
+            if codec_string is not None:
+                codecs[representation_id] = codec_string
+        logger.debug("codec strings: {}".format(codecs))
+        if len(codecs):
+            common.mpd.set_representation_codecs(mpd_file, codecs)
 
     def calc_encoding_params(self, input_file: pathlib.Path, strict=False, size_precision = -1):
         src_metadata = ffmpeg.probe(input_file)
@@ -216,7 +294,7 @@ class DASHLoopEncoder(DASHEncoder):
             subprocess.run(commandline)
         else:
             common.run_subprocess(commandline)
-        self.mpd_manifest_file = output_file
+        self.register_output(output_file)
         return output_file
 
 
@@ -236,9 +314,11 @@ class DashVideoEncoder(DASHEncoder):
 
         return key_frames
 
-    def get_av1an_commandline(self, input_file, ht_video_file, gop_size, width_max, height_max, crf, av1an_scenes_file):
-        av1an_commandline = "av1an -i \"{}\" -o \"{}\" -v \"--cpu-used={} --kf-max-dist={} --kf-min-dist={} ".format(
-            input_file, ht_video_file.name, config.av1_cpu_usage, gop_size, gop_size
+    def get_av1an_commandline(
+            self, input_file, ht_video_file, gop_size, width_max, height_max, crf, av1an_scenes_file, temp_dir
+    ):
+        av1an_commandline = "av1an -i \"{}\" -o \"{}\" --temp \"{}\" -v \"--cpu-used={} --kf-max-dist={} --kf-min-dist={} ".format(
+            input_file, ht_video_file, temp_dir, config.av1_cpu_usage, gop_size, gop_size
         )
 
         if width_max <= 1920 and height_max <= 1920:
@@ -252,7 +332,7 @@ class DashVideoEncoder(DASHEncoder):
         if config.av1_cpu_usage <= 4:
             av1an_commandline += " --lag-in-frames=48 --enable-qm=1 --enable-fwd-kf=0 --enable-chroma-deltaq=0 --enable-keyframe-filtering=1 --arnr-strength=1"
         av1an_commandline += "\" -w {} -s {} -a=\"-an\" --passes=1".format(
-            self.av1an_workers, av1an_scenes_file.name
+            self.av1an_workers, av1an_scenes_file
         )
         av1an_commandline += " --ffmpeg=\"-vf scale={}x{}\" ".format(width_max, height_max)
         if logging.root.level >= logging.ERROR:
@@ -260,10 +340,17 @@ class DashVideoEncoder(DASHEncoder):
         return shlex.split(av1an_commandline)
 
     def encode(self, input_file: pathlib.Path, output_file: pathlib.Path) -> pathlib.Path:
+        # intermediate streams and av1an chunks take a few times the source size
+        with scratch.job(input_file.stat().st_size * 4) as scratch_job:
+            return self._encode(input_file, output_file, scratch_job)
+
+    def _encode(
+            self, input_file: pathlib.Path, output_file: pathlib.Path, scratch_job: scratch.ScratchJob
+    ) -> pathlib.Path:
         width_max, height_max, width_small, height_small, gop_size, crf, lt_gap, fps = \
             self.calc_encoding_params(input_file)
 
-        lt_video_file = tempfile.NamedTemporaryFile(suffix=".mp4")
+        lt_video_file = scratch_job.file(".mp4")
 
         low_tier_transcoding_commandline = [
             "ffmpeg"]
@@ -281,23 +368,19 @@ class DashVideoEncoder(DASHEncoder):
             "-preset:v:0", "veryslow",
             "-g", str(gop_size),
             "-keyint_min", str(int(round(fps * 0.5))),
-            lt_video_file.name
+            str(lt_video_file)
         ]
 
-        ht_video_file = None
-        av1an_scenes_file = None
         commandline = [
             "ffmpeg",
         ]
         commandline += ['-loglevel', 'info']
 
-        av1_rfc_codec_string = None
-
         common.run_subprocess(low_tier_transcoding_commandline)
 
         if width_max <= 720 or height_max <= 720:
             commandline += [
-                "-i", lt_video_file.name,
+                "-i", str(lt_video_file),
                 "-i", input_file,
                 "-map", "0:v",
                 "-map", "1:a:0?",
@@ -309,7 +392,7 @@ class DashVideoEncoder(DASHEncoder):
                     "-print_format", "json",
                     "-show_frames",
                     "-show_entries", "frame=key_frame",
-                    lt_video_file.name
+                    str(lt_video_file)
                 ]
             )
 
@@ -334,25 +417,22 @@ class DashVideoEncoder(DASHEncoder):
 
             av1an_scenes = {"scenes": scenes, "frames": frames_count}
 
-            ht_video_file = pathlib.Path(
-                ''.join(random.choice(string.ascii_lowercase) for i in range(16))
-            ).with_suffix(".mkv")
+            ht_video_file = scratch_job.file(".mkv")
 
-            av1an_scenes_file = pathlib.Path(
-                ''.join(random.choice(string.ascii_lowercase) for i in range(16))
-            ).with_suffix(".json")
+            av1an_scenes_file = scratch_job.file(".json")
             with av1an_scenes_file.open("w") as f:
                 json.dump(av1an_scenes, f)
 
             av1an_commandline = self.get_av1an_commandline(
-                input_file, ht_video_file, gop_size, width_max, height_max, crf, av1an_scenes_file
+                input_file, ht_video_file, gop_size, width_max, height_max, crf, av1an_scenes_file,
+                scratch_job.job_dir.joinpath("av1an")
             )
             logger.debug(av1an_commandline.__repr__())
             subprocess.run(av1an_commandline)
 
             commandline += [
-                "-i", ht_video_file.name,
-                "-i", lt_video_file.name,
+                "-i", str(ht_video_file),
+                "-i", str(lt_video_file),
                 "-i", input_file,
                 "-map", "0:v",
                 "-map", "1:v",
@@ -373,7 +453,6 @@ class DashVideoEncoder(DASHEncoder):
             "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
             "-f", "dash"
         ]
-        ht_init = output_file.with_name("{}-init-0.m4s".format(output_file.name))
         output_file = output_file.with_suffix(".mpd")
         commandline += [
             output_file
@@ -381,26 +460,9 @@ class DashVideoEncoder(DASHEncoder):
         common.run_subprocess(
             commandline
         )
-        lt_video_file.close()
-        if ht_video_file is not None:
-            mp4box_info_process = subprocess.run(["MP4Box", "-info", ht_init], stderr=subprocess.PIPE)
-            mp4box_output = io.StringIO(str(mp4box_info_process.stderr, "utf-8"))
-            rfc_codec_params_label: Final[str] = "RFC6381 Codec Parameters: "
-            for line in mp4box_output:
-                if rfc_codec_params_label in line:
-                    av1_rfc_codec_string = line.strip()[len(rfc_codec_params_label):]
-
-            ht_video_file.unlink()
-        if av1an_scenes_file is not None:
-            av1an_scenes_file.unlink()
-        if av1_rfc_codec_string is not None:
-            mpd_document: xml.dom.minidom.Document = xml.dom.minidom.parse(str(output_file))
-            av1_representation_element: xml.dom.minidom.Element = mpd_document.getElementsByTagName("Representation")[0]
-            av1_representation_element.setAttribute("codecs", av1_rfc_codec_string)
-            with output_file.open(mode="w") as f:
-                mpd_document.writexml(f)
-
-        self.mpd_manifest_file = output_file
+        self.fix_codec_strings(output_file)
+
+        self.register_output(output_file)
         return output_file
 
 
@@ -413,65 +475,38 @@ class SVTAV1DashVideoEncoder(DASHEncoder):
         width_max, height_max, width_small, height_small, gop_size, crf, lt_gap, fps = \
             self.calc_encoding_params(input_file)
         if width_max != width_small or height_max != height_small:
-            commandline = [
-                "ffmpeg",
-                "-i", input_file,
-                "-filter_complex",
-                f"[0]scale={width_max}x{height_max}[v1],[0]scale={width_small}x{height_small}[v2],[v1]setsar=1[v1],[v2]setsar=1[v2]",
-                "-map", "[v1]",
-                "-map", "[v2]",
-                "-map", "0:a?",
-                "-pix_fmt:0", "yuv420p10le",
-                "-pix_fmt:1", "yuv420p",
-                "-c:v:0", "libsvtav1",
-                "-preset:v:0", str(config.av1_cpu_usage),
-                "-b:v:0", "0",
-                "-crf:0", str(crf),
-                "-crf:1", str(crf),
-                "-c:v:1", "libx264",
-                "-preset:v:1", "veryslow",
-                '-threads', str(config.dash_encoding_threads),
-                "-keyint_min", str(gop_size),
-                "-g", str(gop_size),
-                "-sc_threshold", "0",
-                "-c:a", "copy",
-                "-dash_segment_type", "auto",
-                "-seg_duration", str(self._gop_size),
-                "-media_seg_name", '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
-                "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
-                "-f", "dash"
+            representations = [
+                VideoRepresentation({
+                    "pix_fmt": "yuv420p10le",
+                    "c": "libsvtav1",
+                    "preset": str(config.av1_cpu_usage),
+                    "b": "0",
+                    "crf": str(crf),
+                    "keyint_min": str(gop_size),
+                    "g": str(gop_size),
+                    "sc_threshold": "0",
+                }, f"scale={width_max}x{height_max},setsar=1"),
+                VideoRepresentation({
+                    "pix_fmt": "yuv420p",
+                    "c": "libx264",
+                    "preset": "veryslow",
+                    "crf": str(crf),
+                    "keyint_min": str(gop_size),
+                    "g": str(gop_size),
+                    "sc_threshold": "0",
+                }, f"scale={width_small}x{height_small},setsar=1"),
             ]
         else:
-            commandline = [
-                "ffmpeg",
-                "-i", input_file,
-                "-filter_complex",
-                f"[0]scale={width_max}x{height_max}[v1]",
-                "-map", "[v1]",
-                "-map", "0:a?",
-                "-pix_fmt", "yuv420p",
-                "-crf", str(crf),
-                "-c:v", "libx264",
-                "-preset:v", "veryslow",
-                '-threads', str(config.dash_encoding_threads),
-                "-g", str(gop_size),
-                "-c:a", "copy",
-                "-dash_segment_type", "auto",
-                "-seg_duration", str(self._gop_size),
-                "-media_seg_name", '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
-                "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
-                "-f", "dash"
+            representations = [
+                VideoRepresentation({
+                    "pix_fmt": "yuv420p",
+                    "crf": str(crf),
+                    "c": "libx264",
+                    "preset": "veryslow",
+                    "g": str(gop_size),
+                }, f"scale={width_max}x{height_max}"),
             ]
-        output_file = output_file.with_suffix(".mpd")
-        commandline += [
-            output_file
-        ]
-        if config.show_output_in_console:
-            subprocess.run(commandline)
-        else:
-            common.run_subprocess(commandline)
-        self.mpd_manifest_file = output_file
-        return output_file
+        return self.encode_representations(input_file, output_file, representations, fps)
 
 CL2_MAX_SIDE_LIMIT = 1920
 CL2_MIN_SIDE_LIMIT = 1080
@@ -539,192 +574,107 @@ class SourceAdaptiveTranscoder(DASHEncoder):
                         scale_coef = height_orig / min_size
                         width_small = int(common.bit_round(width_orig / scale_coef, precision))
             return width_small, height_small
-        commandline = []
-        def make_transcode_downscale_commandline():
+        def make_transcode_downscale_representations():
             width_cl2, height_cl2 = calc_size(CL2_MIN_SIDE_LIMIT, max_size=CL2_MAX_SIDE_LIMIT, precision=0)
             scale_coef = width_orig / width_cl2
             aspect_ratio = width_cl2 / height_cl2
             width_max, height_max, rounded_scale_coef = DASHEncoder.get_rounded_size(
                 width_cl2, height_cl2, scale_coef, aspect_ratio
             )
+            cl3_representation = VideoRepresentation({
+                "r": str(cl3_fps),
+                "pix_fmt": "yuv420p",
+                "crf": str(crf),
+                "c": "libx264",
+                "preset": "veryslow",
+                "g": str(gop_size),
+            }, f"scale={width_small}x{height_small}")
             if rounded_scale_coef == 1:
-                commandline = [
-                    "ffmpeg",
-                    "-i", input_file,
-                    "-filter_complex",
-                    f"[0]scale={width_cl2}x{height_cl2}[v1],[0]scale={width_small}x{height_small}[v2]",
-                    "-map", "[v1]",
-                    "-map", "[v2]",
-                    "-map", "0:a?",
-                    "-r:v:1", str(cl3_fps),
-                    "-pix_fmt:v", "yuv420p",
-                    "-crf:v", str(crf),
-                    "-c:v:0", "libvpx-vp9",
-                    "-cpu-used", str(config.av1_cpu_usage),
-                    "-c:v:1", "libx264",
-                    "-preset:v:1", "veryslow",
-                    '-threads', str(config.dash_encoding_threads),
-                    "-g:v:0", str(cl1_gop_size),
-                    "-g:v:1", str(gop_size),
-                    "-c:a", "copy",
-                    "-dash_segment_type", "auto",
-                    "-seg_duration", str(self._gop_size),
-                    "-media_seg_name", '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
-                    "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
-                    "-f", "dash"
-                ]
+                return [
+                    VideoRepresentation({
+                        "pix_fmt": "yuv420p",
+                        "crf": str(crf),
+                        "c": "libvpx-vp9",
+                        "cpu-used": str(config.av1_cpu_usage),
+                        "g": str(cl1_gop_size),
+                    }, f"scale={width_cl2}x{height_cl2}"),
+                    cl3_representation
+                ], []
             else:
-                commandline = [
-                    "ffmpeg",
-                    "-i", input_file,
-                    "-filter_complex",
-                    f"[0]scale={width_max}x{height_max}[v0],[0]scale={width_cl2}x{height_cl2}[v1],[0]scale={width_small}x{height_small}[v2]",
-                    "-map", "[v0]",
-                    "-map", "[v1]",
-                    "-map", "[v2]",
-                    "-map", "0:a?",
-                    "-r:v:2", str(cl3_fps),
-                    "-pix_fmt:v", "yuv420p10le",
-                    "-pix_fmt:v", "yuv420p",
-                    "-crf:v", str(crf),
-                    "-c:v", "libvpx-vp9",
-                    "-cpu-used", str(config.av1_cpu_usage),
-                    "-c:v:2", "libx264",
-                    "-preset:v:2", "veryslow",
-                    '-threads', str(config.dash_encoding_threads),
-                    "-sc_threshold:v:0", "0",
-                    "-sc_threshold:v:1", "0",
-                    "-g:v:0", str(cl1_gop_size),
-                    "-g:v:1", str(cl1_gop_size),
-                    "-g:v:2", str(gop_size),
-                    "-c:a", "copy",
-                    "-dash_segment_type", "auto",
-                    "-seg_duration", str(self._gop_size),
-                    "-media_seg_name", '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
-                    "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
-                    "-adaptation_sets", "id=0,streams=0,1 id=1,streams=2 id=2,streams=a",
-                    "-f", "dash"
-                ]
-            return commandline
+                return [
+                    VideoRepresentation({
+                        "pix_fmt": "yuv420p",
+                        "crf": str(crf),
+                        "c": "libvpx-vp9",
+                        "cpu-used": str(config.av1_cpu_usage),
+                        "sc_threshold": "0",
+                        "g": str(cl1_gop_size),
+                    }, f"scale={width_max}x{height_max}"),
+                    VideoRepresentation({
+                        "pix_fmt": "yuv420p",
+                        "crf": str(crf),
+                        "c": "libvpx-vp9",
+                        "cpu-used": str(config.av1_cpu_usage),
+                        "sc_threshold": "0",
+                        "g": str(cl1_gop_size),
+                    }, f"scale={width_cl2}x{height_cl2}"),
+                    cl3_representation
+                ], ["-adaptation_sets", "id=0,streams=0,1 id=1,streams=2 id=2,streams=a"]
+
+        def make_vp9_representations():
+            return [
+                VideoRepresentation({
+                    "pix_fmt": "yuv420p",
+                    "c": "libvpx-vp9",
+                    "cpu-used": str(config.av1_cpu_usage),
+                    "b": "0",
+                    "crf": str(crf),
+                    "g": str(cl1_gop_size),
+                }),
+                VideoRepresentation({
+                    "pix_fmt": "yuv420p",
+                    "crf": str(crf),
+                    "c": "libx264",
+                    "preset": "veryslow",
+                    "g": str(gop_size),
+                    "r": str(cl3_fps),
+                }, f"scale={width_small}x{height_small}"),
+            ]
+
+        extra_output_options = []
+        fixed_segment_duration = True
         if transcode_required:
             compatible_codec = video_codec_name in {"h264", "vp8", "vp9", "av1"}
             width_small, height_small = calc_size(720, max_size=1280)
             crf = self._crf
             gop_size = int(round(self._gop_size * cl3_fps))
             cl1_gop_size = int(round(self._gop_size * fps))
-            if compatible_codec:
-                compatible_resolution = max_side <= CL2_MAX_SIDE_LIMIT and min_side <= CL2_MIN_SIDE_LIMIT
-                if compatible_resolution:
-                    if video_codec_name == "vp8" and fps > 30:
-                        commandline = [
-                            "ffmpeg",
-                            "-i", input_file,
-                            "-filter_complex",
-                            f"[0]scale={width_small}x{height_small}[v1]",
-                            "-map", "0:v:0",
-                            "-map", "[v1]",
-                            "-map", "0:a?",
-                            "-pix_fmt", "yuv420p",
-                            "-c:v:0", "libvpx-vp9",
-                            "-cpu-used", str(config.av1_cpu_usage),
-                            "-b:v:0", "0",
-                            "-crf:0", str(crf),
-                            "-crf:1", str(crf),
-                            "-c:v:1", "libx264",
-                            "-preset:v:1", "veryslow",
-                            '-threads', str(config.dash_encoding_threads),
-                            "-g:v:0", str(cl1_gop_size),
-                            "-g:v:1", str(gop_size),
-                            "-r:v:1", str(cl3_fps),
-                            "-c:a", "copy",
-                            "-dash_segment_type", "auto",
-                            "-seg_duration", str(self._gop_size),
-                            "-media_seg_name",
-                            '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
-                            "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
-                            "-f", "dash"
-                        ]
-                    else:
-                        commandline = [
-                            "ffmpeg",
-                            "-i", input_file,
-                            "-filter_complex",
-                            f"[0]scale={width_small}x{height_small}[v1]",
-                            "-map", "0:v:0",
-                            "-map", "[v1]",
-                            "-map", "0:a?",
-                            "-r:v:1", str(cl3_fps),
-                            "-pix_fmt:v:1", "yuv420p",
-                            "-crf:v:1", str(crf),
-                            "-c:v:0", "copy",
-                            "-c:v:1", "libx264",
-                            "-preset:v", "slow",
-                            '-threads', str(config.dash_encoding_threads),
-                            "-g:v:1", str(gop_size),
-                            "-c:a", "copy",
-                            "-dash_segment_type", "auto",
-                            "-seg_duration", str(self._gop_size),
-                            "-media_seg_name", '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
-                            "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
-                            "-f", "dash"
-                        ]
-                else:
-                    commandline = make_transcode_downscale_commandline()
+            compatible_resolution = max_side <= CL2_MAX_SIDE_LIMIT and min_side <= CL2_MIN_SIDE_LIMIT
+            if not compatible_resolution:
+                representations, extra_output_options = make_transcode_downscale_representations()
+            elif compatible_codec and not (video_codec_name == "vp8" and fps > 30):
+                representations = [
+                    VideoRepresentation({"c": "copy"}),
+                    VideoRepresentation({
+                        "r": str(cl3_fps),
+                        "pix_fmt": "yuv420p",
+                        "crf": str(crf),
+                        "c": "libx264",
+                        "preset": "slow",
+                        "g": str(gop_size),
+                    }, f"scale={width_small}x{height_small}"),
+                ]
             else:
-                compatible_resolution = max_side <= CL2_MAX_SIDE_LIMIT and min_side <= CL2_MIN_SIDE_LIMIT
-                if compatible_resolution:
-                    commandline = [
-                        "ffmpeg",
-                        "-i", input_file,
-                        "-filter_complex",
-                        f"[0]scale={width_small}x{height_small}[v1]",
-                        "-map", "0:v:0",
-                        "-map", "[v1]",
-                        "-map", "0:a?",
-                        "-pix_fmt", "yuv420p",
-                        "-c:v:0", "libvpx-vp9",
-                        "-cpu-used", str(config.av1_cpu_usage),
-                        "-b:v:0", "0",
-                        "-crf:0", str(crf),
-                        "-crf:1", str(crf),
-                        "-c:v:1", "libx264",
-                        "-preset:v:1", "veryslow",
-                        '-threads', str(config.dash_encoding_threads),
-                        "-g:v:0", str(cl1_gop_size),
-                        "-g:v:1", str(gop_size),
-                        "-r:v:1", str(cl3_fps),
-                        "-c:a", "copy",
-                        "-dash_segment_type", "auto",
-                        "-seg_duration", str(self._gop_size),
-                        "-media_seg_name", '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
-                        "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
-                        "-f", "dash"
-                    ]
-                else:
-                    commandline = make_transcode_downscale_commandline()
-        else:
-            commandline = [
-                "ffmpeg",
-                "-i", input_file,
-                "-map", "0:v:0",
-                "-map", "0:a?",
-                "-c", "copy",
-                "-dash_segment_type", "auto",
-                # default segment duration is unknown. May become turned on in future
-                #"-seg_duration", str(self._gop_size),
-                "-media_seg_name", '{}-chunk-$RepresentationID$-$Number%05d$.$ext$'.format(output_file.name),
-                "-init_seg_name", '{}-init-$RepresentationID$.$ext$'.format(output_file.name),
-                "-f", "dash",
-            ]
-        output_file = output_file.with_suffix(".mpd")
-        commandline += [
-            output_file
-        ]
-        logger.debug("commandline: {}".format(commandline))
-        if config.show_output_in_console:
-            subprocess.run(commandline)
+                representations = make_vp9_representations()
         else:
-            common.run_subprocess(commandline)
-        self.mpd_manifest_file = output_file
-        return output_file
-
+            representations = [VideoRepresentation({"c": "copy"})]
+            # default segment duration is unknown. May become turned on in future
+            fixed_segment_duration = False
+        return self.encode_representations(
+            input_file,
+            output_file,
+            representations,
+            fps,
+            extra_output_options,
+            fixed_segment_duration
+        )
@@ -1,11 +1,11 @@
 import pathlib
 import subprocess
-import tempfile
 
 import PIL.Image
 
 from . import encoder
 from ... import common
+from ...common import scratch
 from ... import config
 
 
@@ -18,23 +18,22 @@ class JpegXlEncoder(encoder.BytesEncoder):
         self.img = img
 
     def encode(self, quality) -> bytes:
-        source_handler = common.utils.InputSourceFacade(
-            self.source, ".png", common.utils.pil_writer(self.img)
-        )
-        src_tmp_file_name = source_handler.get_file_str()
-        output_tmp_file = tempfile.NamedTemporaryFile(
-            mode='rb', suffix=".jxl", delete=True
-        )
-        commandline = [
-            "cjxl",
-            src_tmp_file_name,
-            output_tmp_file.name,
-            "-q", str(quality)
-        ]
-        common.run_subprocess(commandline, log_stdout=True)
-        source_handler.close()
-        encoded_data = output_tmp_file.read()
-        output_tmp_file.close()
+        # uncompressed source copy and encoded output
+        with scratch.job(self.img.width * self.img.height * 8) as scratch_job:
+            if isinstance(self.source, (str, pathlib.Path)):
+                src_file = self.source
+            else:
+                src_file = scratch_job.file(".png")
+                self.img.save(src_file, format="PNG")
+            output_tmp_file = scratch_job.file(".jxl")
+            commandline = [
+                "cjxl",
+                src_file,
+                output_tmp_file,
+                "-q", str(quality)
+            ]
+            common.run_subprocess(commandline, log_stdout=True)
+            encoded_data = output_tmp_file.read_bytes()
         return encoded_data
 
 
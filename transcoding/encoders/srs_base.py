@@ -1,11 +1,11 @@
-import json
 import logging
 import pathlib
 from abc import ABC
 import PIL.Image
 
-from pyimglib import metadata
+from pyimglib import decoders, metadata
 from pyimglib.ACLMMP import specification as srs_spec
+from pyimglib.common import srs_index
 from pyimglib.transcoding.encoders import encoder
 
 logger = logging.getLogger(__name__)
@@ -21,45 +21,25 @@ def test_alpha_channel(img: PIL.Image.Image):
     return True
 
 
-MEDIA_TYPE_CODE_TO_STREAM_TYPE_KEY = {
-    0: ("image",),
-    1: ("audio",),
-    2: ("video", "audio"),
-    3: ("video",),
-}
-
-
 class SrsEncoderBase(encoder.FilesEncoder, ABC):
+    srs_data: dict | None = None
+
     def set_manifest_file(self, manifest_file: pathlib.Path):
         self.srs_file_path = manifest_file
+        self.srs_data = None
+
+    def write_manifest(self, manifest_file: pathlib.Path, srs_data: dict):
+        self.srs_file_path = manifest_file
+        self.srs_data = srs_data
+        srs_index.write_manifest(manifest_file, srs_data)
 
     def get_files(self) -> list[pathlib.Path]:
-        srs_data = None
         parent_dir = self.srs_file_path.parent
-        with self.srs_file_path.open("r") as f:
-            srs_data = json.load(f)
-
-        stream_type_keys = MEDIA_TYPE_CODE_TO_STREAM_TYPE_KEY[
-            srs_data["content"]["media-type"]
-        ]
-
-        list_files = []
-        for stream_type_key in stream_type_keys:
-            if stream_type_key == "audio":
-                for stream in srs_data["streams"]["audio"]:
-                    for channel in stream["channels"]:
-                        for level in stream["channels"][channel]:
-                            file_path = parent_dir.joinpath(
-                                stream["channels"][channel][level]
-                            )
-                            list_files.append(file_path)
-            else:
-                for level in srs_data["streams"][stream_type_key]["levels"]:
-                    file_path = parent_dir.joinpath(
-                        srs_data["streams"][stream_type_key]["levels"][level]
-                    )
-                    list_files.append(file_path)
-
+        if self.srs_data is not None:
+            file_names = srs_index.manifest_files(self.srs_data)
+        else:
+            file_names = srs_index.files(self.srs_file_path)
+        list_files = [parent_dir.joinpath(file_name) for file_name in file_names]
         list_files.append(self.srs_file_path)
         return list_files
 
@@ -117,6 +97,16 @@ class BaseImageSrsEncoder(SrsEncoderBase):
         if cl3_file_name is not None:
             srs_data["streams"]["image"]["levels"]["3"] = cl3_file_name
 
+        level_sizes = dict()
+        for level, file_name in srs_data["streams"]["image"]["levels"].items():
+            try:
+                level_sizes[level] = list(
+                    decoders.probe_image(output_file.parent.joinpath(file_name)).size
+                )
+            except (ValueError, OSError):
+                pass
+        srs_data["content"]["level-sizes"] = level_sizes
+
         if input_file.suffix == ".png":
             srs_data["content"]["attachment"] = metadata.png_reader.read(
                 input_file
@@ -128,9 +118,7 @@ class BaseImageSrsEncoder(SrsEncoderBase):
 
         logger.debug("srs content: {}".format(srs_data.__repr__()))
 
-        self.srs_file_path = output_file.with_suffix(".srs")
-        with self.srs_file_path.open("w") as f:
-            json.dump(srs_data, f)
+        self.write_manifest(output_file.with_suffix(".srs"), srs_data)
 
     @staticmethod
     def check_cl_size_limit(img, compatibility_level: int):
@@ -1,7 +1,6 @@
 import logging
 import math
 import pathlib
-import tempfile
 import typing
 
 import PIL.Image
@@ -10,6 +9,7 @@ from .srs_base import BaseImageSrsEncoder, test_alpha_channel
 
 from ... import config
 from ... import common
+from ...common import scratch
 from . import avif_encoder, encoder
 from pyimglib.ACLMMP import specification as srs_spec
 
@@ -119,32 +119,30 @@ class SrsLossyJpegXlEncoder(BaseImageSrsEncoder):
         self._cl1_suffix = cl1_suffix
 
     def encode_cl2(self, source: PIL.Image.Image, output_file: pathlib.Path):
-        jpeg_tmp_file = tempfile.NamedTemporaryFile(suffix=".jpg")
-        if config.jpegli_enabled:
-            src_tmp_file = tempfile.NamedTemporaryFile(suffix=".png")
-            source.save(src_tmp_file, "PNG")
-            source_file = src_tmp_file.name
-            # use cjpegli encoder to generate libjxl tuned jpeg file
+        with scratch.job(source.width * source.height * 4) as scratch_job:
+            jpeg_tmp_file = scratch_job.file(".jpg")
+            if config.jpegli_enabled:
+                src_tmp_file = scratch_job.file(".png")
+                source.save(src_tmp_file, "PNG")
+                # use cjpegli encoder to generate libjxl tuned jpeg file
+                commandline = [
+                    "cjpegli",
+                    src_tmp_file,
+                    jpeg_tmp_file
+                ]
+                common.run_subprocess(commandline, log_stdout=True)
+            else:
+                if source.mode == "RGBA":
+                    _source = source.convert(mode="RGB")
+                    source.close()
+                    source = _source
+                source.save(jpeg_tmp_file, "JPEG", quality=90, subsampling=0)
             commandline = [
-                "cjpegli",
-                source_file,
-                jpeg_tmp_file.name
+                "cjxl",
+                jpeg_tmp_file,
+                output_file
             ]
             common.run_subprocess(commandline, log_stdout=True)
-            src_tmp_file.close()
-        else:
-            if source.mode == "RGBA":
-                _source = source.convert(mode="RGB")
-                source.close()
-                source = _source
-            source.save(jpeg_tmp_file, "JPEG", quality=90, subsampling=0)
-        commandline = [
-            "cjxl",
-            jpeg_tmp_file.name,
-            output_file
-        ]
-        common.run_subprocess(commandline, log_stdout=True)
-        jpeg_tmp_file.close()
 
     def encode_cl1(self, input_file: pathlib.Path, output_file: pathlib.Path, img: PIL.Image.Image = None):
         commandline = [
@@ -172,6 +170,7 @@ class SrsLossyJpegXlEncoder(BaseImageSrsEncoder):
             img.close()
             self.srs_file_path = regular_lossy_encoder.encode(
                 input_file, output_file)
+            self.srs_data = regular_lossy_encoder.srs_data
             return self.srs_file_path
 
         cl2_file_name = None
@@ -1,13 +1,10 @@
 from fractions import Fraction
 import logging
 import pathlib
-import json
 import dataclasses
-import random
-import string
 from typing import Union
-from ... import common, config
-from . import srs_base
+from ... import common, config, decoders
+from . import srs_base, storyboard, webp_encoder
 from pyimglib.ACLMMP import specification as srs_spec
 
 import abc
@@ -32,6 +29,7 @@ ContainerType = Union[
 class Metadata:
     video_stream: dict
     audio_streams: list[dict]
+    duration: float | None = None
 
 
 @dataclasses.dataclass(frozen=True)
@@ -212,6 +210,10 @@ class StreamCopying(TranscodingStrategy):
 
 
 class BasicVideoTranscode(TranscodingStrategy):
+    # Options appended to the codec options of the first pass
+    # when config.fast_first_pass is enabled.
+    fast_first_pass_options: list[str] = []
+
     def get_fps(self, stream: StreamSpecification, metadata: Metadata):
         input_fps = common.ffmpeg.parser.get_fps(metadata.video_stream)
         if stream.fps is not None:
@@ -242,7 +244,7 @@ class BasicVideoTranscode(TranscodingStrategy):
         output_fps,
         codec_commandline,
         encoding_pass: int | None,
-        pass_log_file: str | None,
+        pass_log_file: pathlib.Path | None,
         zero_bitrate: bool = False
     ) -> list[str]:
         output_file = str(stream.file_name)
@@ -277,9 +279,7 @@ class BasicVideoTranscode(TranscodingStrategy):
         if encoding_pass is not None and pass_log_file is not None:
             commandline += [
                 "-pass", str(encoding_pass),
-                "-passlogfile", str(
-                    pathlib.Path('/tmp').joinpath(pass_log_file)
-                ),
+                "-passlogfile", str(pass_log_file),
             ]
             if _format is not None:
                 commandline += ["-f", _format]
@@ -289,12 +289,83 @@ class BasicVideoTranscode(TranscodingStrategy):
         ]
         return commandline
 
-    def generate_logfilename(self):
-        sequence = string.ascii_letters + string.digits
-        return "".join(random.choices(sequence, k=12))
+    def first_pass_codec_commandline(self, codec_commandline) -> list[str]:
+        if config.fast_first_pass:
+            return codec_commandline + self.fast_first_pass_options
+        return codec_commandline
+
+    def two_pass_transcode(
+        self,
+        input_file,
+        stream: StreamSpecification,
+        rewrite,
+        vfilters,
+        output_fps,
+        codec_commandline,
+        zero_bitrate: bool = False
+    ):
+        """
+        Runs a two pass encoding.
+        First pass statistics are taken from the pass log cache
+        when the same source was already analysed
+        with the same filter chain and codec options.
+        """
+        pass_log_cache = common.ffmpeg.pass_log.get_cache()
+        first_pass_codec_commandline = \
+            self.first_pass_codec_commandline(codec_commandline)
+        cache_key = pass_log_cache.make_key(
+            pathlib.Path(input_file),
+            stream.stream_index,
+            vfilters,
+            output_fps,
+            first_pass_codec_commandline,
+            stream.crf,
+            stream.bitrate,
+            zero_bitrate
+        )
+        pass_log_file = pass_log_cache.lookup(cache_key)
+        if pass_log_file is None:
+            with pass_log_cache.first_pass(cache_key) as tmp_pass_log_file:
+                commandline = self.generate_commandline(
+                    input_file,
+                    stream,
+                    rewrite,
+                    vfilters,
+                    output_fps,
+                    first_pass_codec_commandline,
+                    1,
+                    tmp_pass_log_file,
+                    zero_bitrate
+                )
+                logger.debug(f"1 pass commandline: {commandline.__repr__()}")
+                transcoding_result = common.utils.run_subprocess(commandline)
+                transcoding_result.check_returncode()
+            pass_log_file = pass_log_cache.get_prefix(cache_key)
+        commandline = self.generate_commandline(
+            input_file,
+            stream,
+            rewrite,
+            vfilters,
+            output_fps,
+            codec_commandline,
+            2,
+            pass_log_file,
+            zero_bitrate
+        )
+        logger.debug(f"2 pass commandline: {commandline.__repr__()}")
+        transcoding_result = common.utils.run_subprocess(commandline)
+        if transcoding_result.returncode != 0:
+            # do not reuse statistics which may be damaged
+            pass_log_cache.purge(cache_key)
+        transcoding_result.check_returncode()
 
 
 class X264VideoTranscode(BasicVideoTranscode):
+    # libx264 already runs the first pass with fast settings
+    # (fastfirstpass), and other presets change the B-frames count,
+    # which makes the statistics incompatible with the second pass.
+    fast_first_pass_options = []
+
     def transcode(self, input_file, metadata, stream, rewrite):
         output_fps = self.get_fps(stream, metadata)
         vfilters = self.vfilters(stream)
@@ -305,33 +376,14 @@ class X264VideoTranscode(BasicVideoTranscode):
         ]
 
         if stream.bitrate is not None:
-            pass_log_file = self.generate_logfilename()
-            commandline = self.generate_commandline(
+            self.two_pass_transcode(
                 input_file,
                 stream,
                 rewrite,
                 vfilters,
                 output_fps,
-                codec_commandline,
-                1,
-                pass_log_file
+                codec_commandline
             )
-            logger.debug(f"1 pass commandline: {commandline.__repr__()}")
-            transcoding_result = common.utils.run_subprocess(commandline)
-            transcoding_result.check_returncode()
-            commandline = self.generate_commandline(
-                input_file,
-                stream,
-                rewrite,
-                vfilters,
-                output_fps,
-                codec_commandline,
-                2,
-                pass_log_file
-            )
-            logger.debug(f"2 pass commandline: {commandline.__repr__()}")
-            transcoding_result = common.utils.run_subprocess(commandline)
-            transcoding_result.check_returncode()
         else:
             commandline = self.generate_commandline(
                 input_file,
@@ -349,6 +401,8 @@ class X264VideoTranscode(BasicVideoTranscode):
 
 
 class SVTAV1VideoTranscode(BasicVideoTranscode):
+    fast_first_pass_options = ["-preset", "8"]
+
     def transcode(self, input_file, metadata, stream, rewrite):
         output_fps = self.get_fps(stream, metadata)
         vfilters = self.vfilters(stream)
@@ -359,33 +413,14 @@ class SVTAV1VideoTranscode(BasicVideoTranscode):
         ]
 
         if stream.bitrate is not None:
-            pass_log_file = self.generate_logfilename()
-            commandline = self.generate_commandline(
+            self.two_pass_transcode(
                 input_file,
                 stream,
                 rewrite,
                 vfilters,
                 output_fps,
-                codec_commandline,
-                1,
-                pass_log_file
-            )
-            logger.debug(f"1 pass commandline: {commandline.__repr__()}")
-            transcoding_result = common.utils.run_subprocess(commandline)
-            transcoding_result.check_returncode()
-            commandline = self.generate_commandline(
-                input_file,
-                stream,
-                rewrite,
-                vfilters,
-                output_fps,
-                codec_commandline,
-                2,
-                pass_log_file
+                codec_commandline
             )
-            logger.debug(f"2 pass commandline: {commandline.__repr__()}")
-            transcoding_result = common.utils.run_subprocess(commandline)
-            transcoding_result.check_returncode()
         else:
             commandline = self.generate_commandline(
                 input_file,
@@ -403,6 +438,8 @@ class SVTAV1VideoTranscode(BasicVideoTranscode):
 
 
 class VP9VideoTranscode(BasicVideoTranscode):
+    fast_first_pass_options = ["-cpu-used", "4"]
+
     def transcode(self, input_file, metadata, stream, rewrite):
         output_fps = self.get_fps(stream, metadata)
         vfilters = self.vfilters(stream)
@@ -412,35 +449,15 @@ class VP9VideoTranscode(BasicVideoTranscode):
             "-preset", "1"
         ]
 
-        pass_log_file = self.generate_logfilename()
-        commandline = self.generate_commandline(
-            input_file,
-            stream,
-            rewrite,
-            vfilters,
-            output_fps,
-            codec_commandline,
-            1,
-            pass_log_file,
-            True
-        )
-        logger.debug(f"1 pass commandline: {commandline.__repr__()}")
-        transcoding_result = common.utils.run_subprocess(commandline)
-        transcoding_result.check_returncode()
-        commandline = self.generate_commandline(
+        self.two_pass_transcode(
             input_file,
             stream,
             rewrite,
             vfilters,
             output_fps,
             codec_commandline,
-            2,
-            pass_log_file,
             True
         )
-        logger.debug(f"2 pass commandline: {commandline.__repr__()}")
-        transcoding_result = common.utils.run_subprocess(commandline)
-        transcoding_result.check_returncode()
 
 
 class OpusAudioTranscode(TranscodingStrategy):
@@ -470,14 +487,33 @@ class OpusAudioTranscode(TranscodingStrategy):
 
 
 class SrsVideoEncoder(srs_base.SrsEncoderBase):
+    # Extract a single frame on encoding and register it as poster image,
+    # so readers get a thumbnail without opening the video.
+    generate_poster_image = False
+    # Poster frame position as a fraction of the video duration.
+    poster_image_position = 0.1
+    poster_image_quality = 80
+    # Render a storyboard (sprite sheet of thumbnails for seek previews)
+    # and register it as "storyboard" attachment.
+    generate_storyboard = False
+    storyboard_max_tiles = 100
+    storyboard_tile_width = 160
+    storyboard_keyframes_only = False
+
     def __init__(self, crf):
         self.crf = crf
+        self.poster_image_file: pathlib.Path | None = None
+        self.poster_image_size: tuple[int, int] | None = None
+        self.storyboard: storyboard.Storyboard | None = None
 
     def parse(self, input_file: pathlib.Path) -> Metadata:
         src_metadata = common.ffmpeg.probe(input_file)
         video = common.ffmpeg.parser.find_video_stream(src_metadata)
         audio_streams = common.ffmpeg.parser.find_audio_streams(src_metadata)
-        return Metadata(video, audio_streams)
+        duration = None
+        if "duration" in src_metadata["format"]:
+            duration = float(src_metadata["format"]["duration"])
+        return Metadata(video, audio_streams, duration)
 
     def detect_compatibility_level(self, video_stream):
         check_levels = [3, 2, 1]
@@ -601,6 +637,33 @@ class SrsVideoEncoder(srs_base.SrsEncoderBase):
                 transcoder = OpusAudioTranscode()
             transcoder.transcode(input_file, metadata, audio, True)
 
+    def write_poster_image(
+        self,
+        input_file: pathlib.Path,
+        specification: MediaSpecification,
+        metadata: Metadata,
+        output_file: pathlib.Path
+    ) -> pathlib.Path:
+        cl3_video = specification.video_streams[-1]
+        size = cl3_video.size
+        if size is None:
+            size = (
+                metadata.video_stream["width"], metadata.video_stream["height"]
+            )
+        at = None
+        if metadata.duration is not None:
+            at = metadata.duration * self.poster_image_position
+        img = decoders.video.poster_frame(input_file, at, size)
+        encoder = webp_encoder.WEBPEncoder(input_file, img)
+        poster_image_file = output_file.with_stem(
+            f"{output_file.stem}_poster"
+        ).with_suffix(encoder.SUFFIX)
+        poster_image_file.write_bytes(
+            encoder.encode(self.poster_image_quality)
+        )
+        self.poster_image_size = img.size
+        return poster_image_file
+
     def write_srs(
         self, specification: MediaSpecification, output_file: pathlib.Path
     ) -> pathlib.Path:
@@ -631,6 +694,14 @@ class SrsVideoEncoder(srs_base.SrsEncoderBase):
         for video in specification.video_streams:
             video_levels[str(video.compatibility_level)] = video.file_name.name
         srs_data["streams"]["video"]["levels"] = video_levels
+        if self.storyboard is not None:
+            srs_data["content"]["attachment"]["storyboard"] = \
+                self.storyboard.index()
+        if self.poster_image_file is not None:
+            srs_data["content"]["poster-image"] = {
+                "levels": {"3": self.poster_image_file.name},
+                "level-sizes": {"3": list(self.poster_image_size)}
+            }
         if len(specification.audio_streams):
             audio_levels_list: list[dict[str, dict[str, str]]] = []
             for audio_stream in specification.audio_streams:
@@ -645,10 +716,7 @@ class SrsVideoEncoder(srs_base.SrsEncoderBase):
             srs_data["streams"]["audio"] = audio_levels_list
 
         srs_output_file = output_file.with_suffix(".srs")
-        self.srs_file_path = srs_output_file
-
-        with srs_output_file.open("w") as srs_file:
-            json.dump(srs_data, srs_file)
+        self.write_manifest(srs_output_file, srs_data)
 
         return srs_output_file
 
@@ -662,4 +730,18 @@ class SrsVideoEncoder(srs_base.SrsEncoderBase):
         specification = self.deduplicate_video_streams(specification)
         logger.debug(f"filtered specification: {specification.__repr__()}")
         self.transcode_source(input_file, specification, metadata)
+        if self.generate_poster_image:
+            self.poster_image_file = self.write_poster_image(
+                input_file, specification, metadata, output_file
+            )
+        if self.generate_storyboard and metadata.duration is not None:
+            self.storyboard = storyboard.generate(
+                input_file,
+                output_file,
+                metadata.duration,
+                common.ffmpeg.parser.get_video_size(metadata.video_stream)[:2],
+                max_tiles=self.storyboard_max_tiles,
+                tile_width=self.storyboard_tile_width,
+                keyframes_only=self.storyboard_keyframes_only
+            )
         return self.write_srs(specification, output_file)
@@ -0,0 +1,99 @@
+import dataclasses
+import logging
+import math
+import pathlib
+
+from ... import common
+
+logger = logging.getLogger(__name__)
+
+STORYBOARD_SUFFIX = ".webp"
+# WebP image size limit
+MAX_SHEET_SIZE = 16383
+
+
+@dataclasses.dataclass(frozen=True)
+class Storyboard:
+    """
+    Sprite sheet of video thumbnails.
+    Tile i (row by row) shows the video at i * interval seconds.
+    """
+    file_name: pathlib.Path
+    interval: float
+    tile_size: tuple[int, int]
+    columns: int
+    rows: int
+    count: int
+
+    def index(self) -> dict:
+        """
+        Timing index for SRS attachment.
+        """
+        return {
+            "file": self.file_name.name,
+            "interval": self.interval,
+            "tile-width": self.tile_size[0],
+            "tile-height": self.tile_size[1],
+            "columns": self.columns,
+            "rows": self.rows,
+            "times": [round(i * self.interval, 3) for i in range(self.count)],
+        }
+
+
+def tile_size(video_size: tuple[int, int], tile_width: int) -> tuple[int, int]:
+    width, height = video_size
+    if width > tile_width:
+        height = height * tile_width / width
+        width = tile_width
+    return max(int(round(width)), 1), max(int(round(height)), 1)
+
+
+def generate(
+    input_file: pathlib.Path,
+    output_file: pathlib.Path,
+    duration: float,
+    video_size: tuple[int, int],
+    max_tiles: int = 100,
+    min_interval: float = 1,
+    tile_width: int = 160,
+    max_columns: int = 10,
+    keyframes_only: bool = False,
+    quality: int = 75
+) -> Storyboard:
+    """
+    Renders the storyboard in one ffmpeg run:
+    fps filter picks a frame per interval, scale and tile filters
+    build the sprite sheet from them.
+    If keyframes_only is set, only keyframes are decoded
+    and each tile shows the nearest keyframe.
+    """
+    interval = max(duration / max_tiles, min_interval)
+    count = max(math.ceil(duration / interval), 1)
+    size = tile_size(video_size, tile_width)
+    columns = min(count, max_columns, MAX_SHEET_SIZE // size[0])
+    rows = math.ceil(count / columns)
+    if rows * size[1] > MAX_SHEET_SIZE:
+        rows = MAX_SHEET_SIZE // size[1]
+        count = rows * columns
+        interval = duration / count
+    file_name = output_file.with_stem(
+        f"{output_file.stem}_storyboard"
+    ).with_suffix(STORYBOARD_SUFFIX)
+    commandline = ["ffmpeg", "-y"]
+    if keyframes_only:
+        commandline += ["-skip_frame", "nokey"]
+    commandline += [
+        "-i", str(input_file),
+        "-map", "0:V:0",
+        "-vf", "fps=1/{},scale={}:{},tile={}x{}".format(
+            interval, size[0], size[1], columns, rows
+        ),
+        "-frames:v", "1",
+        "-c:v", "libwebp",
+        "-quality", str(quality),
+        str(file_name)
+    ]
+    logger.debug(f"commandline: {commandline.__repr__()}")
+    result = common.utils.run_subprocess(commandline)
+    result.check_returncode()
+    return Storyboard(file_name, interval, size, columns, rows, count)
@@ -16,8 +16,10 @@ logger = logging.getLogger(__name__)
 
 
 def is_arithmetic_jpg(file_path):
-    jpeg_decoder = decoders.jpeg.JPEGDecoder(file_path)
-    return jpeg_decoder.arithmetic_coding()
+    try:
+        return common.jpeg_header.read_header(file_path).arithmetic_coding
+    except ValueError as e:
+        raise OSError(e)
 
 
 class JPEGTranscode(base_transcoder.BaseTranscoder):
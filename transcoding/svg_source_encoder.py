@@ -5,7 +5,7 @@ from . import encoders, video_transcoder
 from .encoders.srs_image_encoder import BaseImageSrsEncoder
 import tempfile
 import pathlib
-from PIL.Image import DecompressionBombError, Resampling
+from PIL.Image import Resampling
 from pyimglib.ACLMMP import specification as srs_spec
 
 
@@ -18,18 +18,10 @@ class SVGEncoder(base_transcoder.BaseTranscoder):
             srs_spec.image.cl_size_limit[2],
             srs_spec.image.cl_size_limit[2]
         )
-        try:
-            img = svg_decoder.decode(self._source)
-            if BaseImageSrsEncoder.check_cl_size_limit(
-                img, 2
-            ):
-                img = svg_decoder.decode(self._source, cl2_size_limit)
-                if BaseImageSrsEncoder.check_cl_size_limit(
-                    img, 2
-                ):
-                    img.thumbnail(cl2_size_limit, Resampling.LANCZOS)
-        except DecompressionBombError:
-            img = svg_decoder.decode(self._source, cl2_size_limit)
+        # natural size, limited to CL2 size, is rendered at once
+        img = svg_decoder.decode(self._source, max_size=cl2_size_limit)
+        if BaseImageSrsEncoder.check_cl_size_limit(img, 2):
+            img.thumbnail(cl2_size_limit, Resampling.LANCZOS)
         temporary_image_source = tempfile.NamedTemporaryFile(suffix=".png")
         img.save(temporary_image_source.name, "PNG", compress_level=0)
         with common.utils.InputSourceFacade(self._source) as source_handler: